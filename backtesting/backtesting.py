@@ -1,16 +1,47 @@
 from tqdm import tqdm
+from time import perf_counter
+import numpy as np
 import pandas as pd
+from backtesting.instrumentation import BacktestStats, Profiler
+from backtesting.sessions import Sessions
+from backtesting.execution import ExecutionModel, BUY, SELL
+from backtesting.regime import VolatilityRegime, HIGH_VOLATILITY, LOW_VOLATILITY
 
 class Backtesting:
     # Global parameters as class attributes
     MAX_TOTAL_CONTRACTS = 45      # Global cap across all positions
-    ATR_BASELINE = 1.0            # Baseline ATR value; adjust based on instrument
+    ATR_BASELINE = 1.0            # Baseline ATR value of the fixed volatility regimes (no regime_* params)
     TRADING_FEE = 0.47            # Trading fee per contract (example)
     TRAIL_MULTIPLIER = 1.5        # Multiplier to compute trailing stop distance
+    POSITION_TYPES = ('LONG', 'SHORT')
+    RESULT_SHAPES = ('full', 'summary', 'none')
+    SESSION_MODES = (None, 'reset', 'bridge')
+    RANK_CACHE_SIZE = 32          # Cached ATR percentile ranks (one per regime_window, ~0.4 MB each)
 
-    def __init__(self):
-        # (Optional) Place to initialize instance-specific parameters if needed.
-        pass
+    def __init__(self, indicator_cache=False, session_mode=None, execution=None):
+        """
+        Parameters:
+            indicator_cache (bool): Keep every computed indicator series keyed by its window so
+                repeated runs on the same DataFrame (optimizer trials, sensitivity scans) only
+                compute each (indicator, window) pair once. The cache is reset whenever run()
+                receives a different DataFrame object; do not mutate the data between runs.
+            session_mode (str): How rolling windows and shifts treat the lunch break and the
+                overnight gap (see backtesting/sessions.py):
+                - None (default): bars are adjacent across sessions, as before.
+                - 'reset': windows restart every session; an indicator is missing until its window
+                  fits in the session, and no entry is taken meanwhile (exits keep running).
+                - 'bridge': windows run across sessions on prices with the session-open gaps removed.
+            execution (ExecutionModel): How orders are filled (see backtesting/execution.py).
+                Default: instant fills of the whole order at the bar close.
+        """
+        if session_mode not in self.SESSION_MODES:
+            raise ValueError(f"Unknown session_mode '{session_mode}', expected one of {self.SESSION_MODES}")
+        self.session_mode = session_mode
+        self.execution = execution if execution is not None else ExecutionModel()
+        # Stats of the last instrumented run (None when instrumentation is off)
+        self.last_stats = None
+        self.indicator_cache = {} if indicator_cache else None
+        self._cache_owner = None
 
     # -------------------------------
     # Helper Indicator Functions
@@ -20,12 +51,13 @@ class Backtesting:
         Compute the Average True Range (ATR) of the instrument.
         Assumes data has 'high', 'low', and 'close' columns.
         """
-        data = data.copy()
-        data['H-L'] = data['high'] - data['low']
-        data['H-PC'] = abs(data['high'] - data['close'].shift(1))
-        data['L-PC'] = abs(data['low'] - data['close'].shift(1))
-        data['TR'] = data[['H-L', 'H-PC', 'L-PC']].max(axis=1)
-        atr = data['TR'].rolling(window=window).mean()
+        previous_close = data['close'].shift(1)
+        true_range = pd.concat([
+            data['high'] - data['low'],
+            (data['high'] - previous_close).abs(),
+            (data['low'] - previous_close).abs()
+        ], axis=1).max(axis=1)
+        atr = true_range.rolling(window=window).mean()
         return atr
 
     def RSI(self, data, window=14):
@@ -38,6 +70,104 @@ class Backtesting:
         rs = gain / loss
         return 100 - (100 / (1 + rs))
 
+    def cached(self, trading_data, key, compute, limit=None):
+        """
+        Return compute() for trading_data, memoized under key when the indicator cache is enabled.
+
+        limit bounds the number of entries sharing key[0] (e.g. one per window of an indicator
+        whose window is searched over a wide range); the least recently used one is evicted.
+        """
+        if self.indicator_cache is None:
+            return compute()
+        if self._cache_owner is not trading_data:
+            self.indicator_cache.clear()
+            self._cache_owner = trading_data
+        if key in self.indicator_cache:
+            if limit is not None:
+                # Move to the end: dicts keep insertion order, so the front is least recently used.
+                self.indicator_cache[key] = self.indicator_cache.pop(key)
+            return self.indicator_cache[key]
+        if limit is not None:
+            same_kind = [k for k in self.indicator_cache if k[0] == key[0]]
+            for old_key in same_kind[:max(0, len(same_kind) - limit + 1)]:
+                del self.indicator_cache[old_key]
+        self.indicator_cache[key] = compute()
+        return self.indicator_cache[key]
+
+    def build_indicators(self, trading_data, params):
+        """
+        Compute every indicator used by the strategy.
+        The input is neither modified nor copied; the result is indexed like trading_data.
+        """
+        sma_window_length = params.get("sma_window_length")
+        momentum_lookback = params.get("momentum_lookback")
+        quantity_window = params.get("quantity_window")
+        rsi_window = params.get("rsi_window")
+
+        # In bridge mode the indicators run on gap-free prices; the SMA is moved back to the
+        # current price level so Price/SMA still compares against the traded price.
+        source, level = trading_data, None
+        if self.session_mode == 'bridge':
+            source, level = self.cached(trading_data, ('bridge',), lambda: self.sessions(trading_data).bridge(trading_data))
+        close = source['close']
+
+        def sma_at_price_level():
+            sma = close.rolling(sma_window_length).mean()
+            return sma if level is None else sma + level
+
+        sma = self.cached(trading_data, ('SMA', sma_window_length), sma_at_price_level)
+        indicators = pd.DataFrame({
+            'SMA': sma,
+            'Price/SMA': self.cached(trading_data, ('Price/SMA', sma_window_length), lambda: trading_data['close'] / sma),
+            'Average Quantity': self.cached(trading_data, ('Average Quantity', quantity_window),
+                                            lambda: source['volume'].rolling(quantity_window).mean()),
+            'Acceleration': self.cached(trading_data, ('Acceleration', momentum_lookback),
+                                        lambda: close - close.shift(momentum_lookback)),
+            'Short Acceleration': self.cached(trading_data, ('Short Acceleration', 1), lambda: close - close.shift(1)),
+            'VN30 Acceleration': self.cached(trading_data, ('VN30 Acceleration', momentum_lookback),
+                                             lambda: source['vn30'] - source['vn30'].shift(momentum_lookback)),
+            'RSI': self.cached(trading_data, ('RSI', rsi_window), lambda: self.RSI(source, rsi_window)),
+            'ATR': self.cached(trading_data, ('ATR', 14), lambda: self.ATR(source, window=14))
+        })
+
+        if self.session_mode == 'reset':
+            # Number of earlier bars each indicator looks at.
+            lookbacks = {
+                'SMA': sma_window_length - 1,
+                'Price/SMA': sma_window_length - 1,
+                'Average Quantity': quantity_window - 1,
+                'Acceleration': momentum_lookback,
+                'Short Acceleration': 1,
+                'VN30 Acceleration': momentum_lookback,
+                'RSI': rsi_window,
+                'ATR': 14
+            }
+            sessions = self.sessions(trading_data)
+            for name, lookback in lookbacks.items():
+                indicators[name] = sessions.reset(indicators[name], lookback)
+        return indicators
+
+    def sessions(self, trading_data):
+        """
+        Session ids of trading_data (cached with the indicators).
+        """
+        return self.cached(trading_data, ('sessions',), lambda: Sessions.of(trading_data))
+
+    def volatility_regimes(self, trading_data, indicators, params):
+        """
+        Volatility regime label of every bar (see backtesting/regime.py): rolling ATR percentiles
+        when params has regime_window, regime_low_percentile and regime_high_percentile, otherwise
+        the fixed ATR_BASELINE thresholds. The percentile ranks are cached per window, for the
+        RANK_CACHE_SIZE most recently used windows.
+        """
+        regime = VolatilityRegime.from_params(params, self.ATR_BASELINE)
+        rank = None
+        if regime.window is not None:
+            rank = self.cached(trading_data, ('ATR Rank', regime.window),
+                               lambda: regime.percentile_rank(indicators['ATR'], regime.window),
+                               limit=self.RANK_CACHE_SIZE)
+        return regime.labels(indicators['ATR'], rank)
+
     # -------------------------------
     # Dynamic Sizing Functions
     # -------------------------------
@@ -60,22 +190,22 @@ class Backtesting:
         ratio = abs(row['Acceleration']) / acceleration_threshold
         return min(ratio, 1)
 
-    def calculate_contracts(self, volatility, signal_strength):
+    def calculate_contracts(self, regime, signal_strength):
         """
         Determine contract size between 1 and 10.
         
         - In high volatility, size is scaled down.
         - In low volatility, size is scaled up.
         - Otherwise, size is based on signal strength.
+
+        regime is the precomputed volatility regime label of the bar (see volatility_regimes).
         """
         base_contracts = int(round(signal_strength * 10))
         base_contracts = max(1, min(base_contracts, 10))
-        high_vol_threshold = self.ATR_BASELINE * 1.5
-        low_vol_threshold = self.ATR_BASELINE * 0.5
 
-        if volatility > high_vol_threshold:
+        if regime == HIGH_VOLATILITY:
             adjusted = max(1, base_contracts // 2)
-        elif volatility < low_vol_threshold:
+        elif regime == LOW_VOLATILITY:
             adjusted = min(10, int(round(base_contracts * 1.2)))
         else:
             adjusted = base_contracts
@@ -105,14 +235,21 @@ class Backtesting:
         holdings.append(position)
         return holdings
 
-    def partial_close_position(self, position, cur_price, partial_fraction=0.5):
+    def partial_size(self, position, partial_fraction=0.5):
         """
-        Exit a portion of the position.
-        Returns realized PnL and number of contracts closed.
+        Number of contracts closed by a partial exit (at least one).
         """
         closed_contracts = int(round(position['contracts'] * partial_fraction))
         if closed_contracts < 1:
             closed_contracts = 1
+        return closed_contracts
+
+    def partial_close_position(self, position, cur_price, partial_fraction=0.5, contracts=None):
+        """
+        Exit a portion of the position (partial_size, or the given number of contracts).
+        Returns realized PnL and number of contracts closed.
+        """
+        closed_contracts = self.partial_size(position, partial_fraction) if contracts is None else contracts
         if position['position_type'] == 'LONG':
             realized_pnl = (cur_price - position['entry_price']) * closed_contracts - self.TRADING_FEE * closed_contracts
         else:  # SHORT
@@ -125,11 +262,13 @@ class Backtesting:
             position['trailing_stop'] = position['entry_price'] - self.TRADING_FEE
         return realized_pnl, closed_contracts
 
-    def close_full_position(self, position, cur_price):
+    def close_full_position(self, position, cur_price, contracts=None):
         """
-        Fully exit the position.
+        Fully exit the position, or only the given number of contracts when the fill was capped.
+        The position itself is not modified.
         """
-        contracts = position['contracts']
+        if contracts is None:
+            contracts = position['contracts']
         if position['position_type'] == 'LONG':
             realized_pnl = (cur_price - position['entry_price']) * contracts - self.TRADING_FEE * contracts
         else:
@@ -181,7 +320,7 @@ class Backtesting:
     # -------------------------------
     # Main Backtesting Function
     # -------------------------------
-    def run(self, trading_data, params, asset_value=10000):
+    def run(self, trading_data, params, asset_value=10000, instrument=False, profiler=None, result_shape='full'):
         """
         Run the backtesting strategy using the provided trading data and parameter dictionary.
         
@@ -198,61 +337,136 @@ class Backtesting:
             - short_extra_profit
             - rsi_window
             - rsi_threshold
+        and optionally regime_window, regime_low_percentile and regime_high_percentile to size
+        positions by rolling ATR percentile regimes instead of the fixed ATR_BASELINE.
+
+        result_shape selects which columns are materialized:
+            - 'full': the input columns, the indicators (float32) and the strategy state, where
+              'Position' is categorical and the contract counts are small integers.
+            - 'summary': only the per-bar state (Contracts Held, Cumulative Long/Short, Asset,
+              PNL, Cumulative PNL); the input is not copied.
+            - 'none': a single row holding the final state, for callers that only need the
+              final Cumulative PNL (e.g. the optimizer).
+
+        Instrumentation is opt-in:
+            - instrument (bool): collect per-phase timings and entry/exit counters into a
+              BacktestStats object, attached to the result as result.attrs['stats'] and kept
+              in self.last_stats. The tqdm progress bar is only shown while instrumenting.
+            - profiler (str): 'cprofile' or 'pyinstrument' to also capture a profile of the
+              whole run into stats.profile (implies instrument=True).
+        """
+        if result_shape not in self.RESULT_SHAPES:
+            raise ValueError(f"Unknown result_shape '{result_shape}', expected one of {self.RESULT_SHAPES}")
+        if not instrument and profiler is None:
+            self.last_stats = None
+            return self._run(trading_data, params, asset_value, result_shape, None)
+
+        stats = BacktestStats()
+        active_profiler = Profiler(profiler) if profiler is not None else None
+        start = perf_counter()
+        if active_profiler is not None:
+            active_profiler.start()
+        try:
+            result = self._run(trading_data, params, asset_value, result_shape, stats)
+        finally:
+            if active_profiler is not None:
+                stats.profile = active_profiler.stop()
+        stats.total_time = perf_counter() - start
+        result.attrs['stats'] = stats
+        self.last_stats = stats
+        return result
+
+    def _run(self, trading_data, params, asset_value, result_shape, stats):
+        """
+        Body of run(). When stats is None no instrumentation code is executed.
         """
+        timed = stats is not None
+        if timed:
+            phase_start = perf_counter()
+
         # Extract parameters from the dictionary.
-        sma_window_length = params.get("sma_window_length")
         sma_gap = params.get("sma_gap")
-        momentum_lookback = params.get("momentum_lookback")
         acceleration_threshold = params.get("acceleration_threshold")
         short_acceleration_threshold = params.get("short_acceleration_threshold")
         take_profit_threshold = params.get("take_profit_threshold")
         cut_loss_threshold = params.get("cut_loss_threshold")
-        quantity_window = params.get("quantity_window")
         quantity_multiply = params.get("quantity_multiply")
         short_extra_profit = params.get("short_extra_profit")
-        rsi_window = params.get("rsi_window")
         rsi_threshold = params.get("rsi_threshold")
-        
-        trading_data = trading_data.copy()  
-        trading_data['SMA'] = trading_data['close'].rolling(sma_window_length).mean()
-        trading_data['Price/SMA'] = trading_data['close'] / trading_data['SMA']
-        trading_data['Average Quantity'] = trading_data['volume'].rolling(quantity_window).mean()
-        trading_data['Acceleration'] = trading_data['close'] - trading_data['close'].shift(momentum_lookback)
-        trading_data['Short Acceleration'] = trading_data['close'] - trading_data['close'].shift(1)
-        trading_data['VN30 Acceleration'] = trading_data['vn30'] - trading_data['vn30'].shift(momentum_lookback)
-        trading_data['RSI'] = self.RSI(trading_data, rsi_window)
-        trading_data['ATR'] = self.ATR(trading_data, window=14)
-        trading_data.dropna(inplace=True)
-
-        # Initialize new columns for position counts.
-        trading_data['Contracts Held'] = 0
-        trading_data['Cumulative Long'] = 0
-        trading_data['Cumulative Short'] = 0
+
+        indicators = self.build_indicators(trading_data, params)
+        if timed:
+            phase_end = perf_counter()
+            stats.add_time('indicators', phase_end - phase_start)
+            phase_start = phase_end
+
+        # Keep the rows dropna() would keep on the input joined with its indicators,
+        # and walk them as plain arrays instead of DataFrame rows.
+        input_valid = self.cached(trading_data, ('input',), lambda: trading_data.notna().all(axis=1).to_numpy())
+        ready = indicators.notna().all(axis=1).to_numpy()
+        if self.session_mode == 'reset':
+            # Session warm-ups only block entries: keep every bar from the first ready one on.
+            valid = input_valid & (np.cumsum(ready) > 0)
+            entry_ready = ready[valid]
+        else:
+            valid = input_valid & ready
+            entry_ready = None
+        index = trading_data.index[valid]
+        close = trading_data['close'].to_numpy()[valid]
+        row_columns = {'volume': trading_data['volume'].to_numpy()[valid]}
+        for name in indicators.columns:
+            row_columns[name] = indicators[name].to_numpy()[valid]
+        atr = row_columns['ATR']
+        regimes = self.volatility_regimes(trading_data, indicators, params)[valid]
+        execution = self.execution.prepare(close, row_columns['volume'])
+        # Contract roll markers of a continuous series (data/continuous.py): every position is
+        # flattened on the last bar of a contract and no entry is taken on it.
+        roll = trading_data['Roll'].to_numpy(dtype=bool)[valid] if 'Roll' in trading_data else None
+        n_bars = len(index)
+        if timed:
+            stats.add_time('dropna', perf_counter() - phase_start)
 
         holdings = []              # list of open positions
         total_open_contracts = 0    # global count of contracts currently held
         cumulative_pnl = 0
+        total_realized_pnl = 0
 
         # Initialize cumulative counts for entries.
         cumulative_long_contracts = 0
         cumulative_short_contracts = 0
 
-        trading_data['Asset'] = asset_value
-        trading_data['PNL'] = 0
-        trading_data['Cumulative PNL'] = 0
-        trading_data['Position'] = None
-        trading_data['Entry Price'] = None
-
-        asset_history = []
-        pnl_history = []
-        cumulative_pnl_history = []
-
-        for i in tqdm(range(len(trading_data))):
+        # Per-bar history, only kept when the result shape needs it.
+        record = result_shape != 'none'
+        full = result_shape == 'full'
+        if record:
+            asset_history = np.empty(n_bars)
+            pnl_history = np.empty(n_bars)
+            cumulative_pnl_history = np.empty(n_bars)
+            contracts_held_history = np.empty(n_bars, dtype=np.int16)
+            cumulative_long_history = np.empty(n_bars, dtype=np.int32)
+            cumulative_short_history = np.empty(n_bars, dtype=np.int32)
+        if full:
+            position_codes = np.full(n_bars, -1, dtype=np.int8)
+            entry_price_history = np.full(n_bars, np.nan, dtype=np.float32)
+
+        # Event counters, reported through stats when instrumenting.
+        long_entries = 0
+        short_entries = 0
+        scale_ins = 0
+        partial_closes = 0
+        full_exits = 0
+
+        for i in tqdm(range(n_bars), disable=not timed):
+            if timed:
+                phase_start = perf_counter()
             total_realized_pnl = 0
-            cur_price = trading_data['close'].iloc[i]
-            row = trading_data.iloc[i]
-            current_atr = row['ATR']  # current volatility measure
-            baseline = self.ATR_BASELINE
+            bar_filled = 0             # contracts filled on this bar, for volume-capped execution
+            cur_price = close[i]
+            row = {name: values[i] for name, values in row_columns.items()}
+            current_atr = atr[i]  # current volatility measure
+            current_regime = regimes[i]
+            rolling = roll is not None and roll[i]
+            can_enter = not rolling and (entry_ready is None or entry_ready[i])
 
             # -------------------------
             # EXIT STRATEGY
@@ -260,21 +474,39 @@ class Backtesting:
             for pos in holdings[:]:
                 if pos['position_type'] == 'LONG':
                     if cur_price < pos['entry_price'] - cut_loss_threshold:
-                        pnl, closed = self.close_full_position(pos, cur_price)
+                        fill_price, filled = execution.fill(i, SELL, pos['contracts'], bar_filled)
+                        pnl, closed = self.close_full_position(pos, fill_price, filled)
+                        bar_filled += closed
                         total_realized_pnl += pnl
                         total_open_contracts -= closed
+                        if closed < pos['contracts']:
+                            # Fill capped by the bar volume: the rest stays open.
+                            pos['contracts'] -= closed
+                            continue
                         holdings.remove(pos)
+                        full_exits += 1
                         continue
                     if cur_price >= pos['entry_price'] + take_profit_threshold and not pos['has_partial_exited']:
-                        pnl, closed = self.partial_close_position(pos, cur_price, partial_fraction=0.5)
-                        total_realized_pnl += pnl
-                        total_open_contracts -= closed
-                        pos['trailing_stop'] = pos['entry_price'] + take_profit_threshold
+                        fill_price, filled = execution.fill(i, SELL, self.partial_size(pos, partial_fraction=0.5), bar_filled)
+                        if filled > 0:
+                            pnl, closed = self.partial_close_position(pos, fill_price, contracts=filled)
+                            bar_filled += closed
+                            total_realized_pnl += pnl
+                            total_open_contracts -= closed
+                            partial_closes += 1
+                            pos['trailing_stop'] = pos['entry_price'] + take_profit_threshold
                     if pos['has_partial_exited'] and pos['trailing_stop'] is not None and cur_price < pos['trailing_stop']:
-                        pnl, closed = self.close_full_position(pos, cur_price)
+                        fill_price, filled = execution.fill(i, SELL, pos['contracts'], bar_filled)
+                        pnl, closed = self.close_full_position(pos, fill_price, filled)
+                        bar_filled += closed
                         total_realized_pnl += pnl
                         total_open_contracts -= closed
+                        if closed < pos['contracts']:
+                            # Fill capped by the bar volume: the rest stays open.
+                            pos['contracts'] -= closed
+                            continue
                         holdings.remove(pos)
+                        full_exits += 1
                         continue
                     if pos['has_partial_exited'] and pos['trailing_stop'] is not None:
                         trail_distance = self.TRAIL_MULTIPLIER * current_atr
@@ -282,43 +514,76 @@ class Backtesting:
 
                 if pos['position_type'] == 'SHORT':
                     if cur_price > pos['entry_price'] + cut_loss_threshold:
-                        pnl, closed = self.close_full_position(pos, cur_price)
+                        fill_price, filled = execution.fill(i, BUY, pos['contracts'], bar_filled)
+                        pnl, closed = self.close_full_position(pos, fill_price, filled)
+                        bar_filled += closed
                         total_realized_pnl += pnl
                         total_open_contracts -= closed
+                        if closed < pos['contracts']:
+                            # Fill capped by the bar volume: the rest stays open.
+                            pos['contracts'] -= closed
+                            continue
                         holdings.remove(pos)
+                        full_exits += 1
                         continue
                     if cur_price <= pos['entry_price'] - (take_profit_threshold + short_extra_profit) and not pos['has_partial_exited']:
-                        pnl, closed = self.partial_close_position(pos, cur_price, partial_fraction=0.5)
-                        total_realized_pnl += pnl
-                        total_open_contracts -= closed
-                        pos['trailing_stop'] = pos['entry_price'] - take_profit_threshold
+                        fill_price, filled = execution.fill(i, BUY, self.partial_size(pos, partial_fraction=0.5), bar_filled)
+                        if filled > 0:
+                            pnl, closed = self.partial_close_position(pos, fill_price, contracts=filled)
+                            bar_filled += closed
+                            total_realized_pnl += pnl
+                            total_open_contracts -= closed
+                            partial_closes += 1
+                            pos['trailing_stop'] = pos['entry_price'] - take_profit_threshold
                     if pos['has_partial_exited'] and pos['trailing_stop'] is not None and cur_price > pos['trailing_stop']:
-                        pnl, closed = self.close_full_position(pos, cur_price)
+                        fill_price, filled = execution.fill(i, BUY, pos['contracts'], bar_filled)
+                        pnl, closed = self.close_full_position(pos, fill_price, filled)
+                        bar_filled += closed
                         total_realized_pnl += pnl
                         total_open_contracts -= closed
+                        if closed < pos['contracts']:
+                            # Fill capped by the bar volume: the rest stays open.
+                            pos['contracts'] -= closed
+                            continue
                         holdings.remove(pos)
+                        full_exits += 1
                         continue
                     if pos['has_partial_exited'] and pos['trailing_stop'] is not None:
                         trail_distance = self.TRAIL_MULTIPLIER * current_atr
                         pos = self.update_trailing_stop(pos, cur_price, trail_distance)
 
+            if rolling:
+                for pos in holdings[:]:
+                    # The contract expires: the flatten is not capped by the bar volume.
+                    fill_price, filled = execution.fill(i, SELL if pos['position_type'] == 'LONG' else BUY, pos['contracts'], bar_filled, capped=False)
+                    pnl, closed = self.close_full_position(pos, fill_price, filled)
+                    bar_filled += closed
+                    total_realized_pnl += pnl
+                    total_open_contracts -= closed
+                    if closed < pos['contracts']:
+                        pos['contracts'] -= closed
+                        continue
+                    holdings.remove(pos)
+                    full_exits += 1
+
             asset_value += total_realized_pnl
             cumulative_pnl += total_realized_pnl
-            asset_history.append(asset_value)
-            pnl_history.append(total_realized_pnl)
-            cumulative_pnl_history.append(cumulative_pnl)
+            if timed:
+                phase_end = perf_counter()
+                stats.add_time('exits', phase_end - phase_start)
+                phase_start = phase_end
 
             # -------------------------
             # ENTRY STRATEGY
             # -------------------------
             # LONG entry
-            if self.check_long_position_conditions(row, acceleration_threshold, quantity_multiply, sma_gap, short_acceleration_threshold, rsi_threshold):
+            if can_enter and self.check_long_position_conditions(row, acceleration_threshold, quantity_multiply, sma_gap, short_acceleration_threshold, rsi_threshold):
                 if holdings and holdings[0]['position_type'] == 'SHORT':
                     # Do not open long if a short exists
                     pass
                 else:
                     signal_strength = self.calculate_signal_strength_long(row, acceleration_threshold)
-                    desired_contracts = self.calculate_contracts(current_atr, signal_strength)
+                    desired_contracts = self.calculate_contracts(current_regime, signal_strength)
                     existing_long = None
                     for pos in holdings:
                         if pos['position_type'] == 'LONG':
@@ -327,31 +592,37 @@ class Backtesting:
                     if existing_long:
                         additional_desired = desired_contracts  # additional contracts to add
                         allowed_additional = self.get_allowed_size(additional_desired, total_open_contracts)
+                        fill_price, allowed_additional = execution.fill(i, BUY, allowed_additional, bar_filled)
                         if allowed_additional > 0:
+                            bar_filled += allowed_additional
                             # Update weighted average entry price for long position
                             total_contracts_before = existing_long['contracts']
                             total_contracts_after = total_contracts_before + allowed_additional
                             existing_long['entry_price'] = (
-                                existing_long['entry_price'] * total_contracts_before + cur_price * allowed_additional
+                                existing_long['entry_price'] * total_contracts_before + fill_price * allowed_additional
                             ) / total_contracts_after
                             existing_long['contracts'] = total_contracts_after
                             total_open_contracts += allowed_additional
                             cumulative_long_contracts += allowed_additional
+                            scale_ins += 1
                     else:
                         allowed = self.get_allowed_size(desired_contracts, total_open_contracts)
+                        fill_price, allowed = execution.fill(i, BUY, allowed, bar_filled)
                         if allowed > 0:
-                            holdings = self.open_position('LONG', cur_price, allowed, holdings)
+                            bar_filled += allowed
+                            holdings = self.open_position('LONG', fill_price, allowed, holdings)
                             total_open_contracts += allowed
                             cumulative_long_contracts += allowed
+                            long_entries += 1
 
             # SHORT entry
-            if self.check_short_position_conditions(row, acceleration_threshold, quantity_multiply, sma_gap, short_acceleration_threshold, rsi_threshold):
+            if can_enter and self.check_short_position_conditions(row, acceleration_threshold, quantity_multiply, sma_gap, short_acceleration_threshold, rsi_threshold):
                 if holdings and holdings[0]['position_type'] == 'LONG':
                     # Do not open short if a long exists
                     pass
                 else:
                     signal_strength = self.calculate_signal_strength_short(row, acceleration_threshold)
-                    desired_contracts = self.calculate_contracts(current_atr, signal_strength)
+                    desired_contracts = self.calculate_contracts(current_regime, signal_strength)
                     existing_short = None
                     for pos in holdings:
                         if pos['position_type'] == 'SHORT':
@@ -360,38 +631,86 @@ class Backtesting:
                     if existing_short:
                         additional_desired = desired_contracts
                         allowed_additional = self.get_allowed_size(additional_desired, total_open_contracts)
+                        fill_price, allowed_additional = execution.fill(i, SELL, allowed_additional, bar_filled)
                         if allowed_additional > 0:
+                            bar_filled += allowed_additional
                             # Update weighted average entry price for short position
                             total_contracts_before = existing_short['contracts']
                             total_contracts_after = total_contracts_before + allowed_additional
                             existing_short['entry_price'] = (
-                                existing_short['entry_price'] * total_contracts_before + cur_price * allowed_additional
+                                existing_short['entry_price'] * total_contracts_before + fill_price * allowed_additional
                             ) / total_contracts_after
                             existing_short['contracts'] = total_contracts_after
                             total_open_contracts += allowed_additional
                             cumulative_short_contracts += allowed_additional
+                            scale_ins += 1
                     else:
                         allowed = self.get_allowed_size(desired_contracts, total_open_contracts)
+                        fill_price, allowed = execution.fill(i, SELL, allowed, bar_filled)
                         if allowed > 0:
-                            holdings = self.open_position('SHORT', cur_price, allowed, holdings)
+                            bar_filled += allowed
+                            holdings = self.open_position('SHORT', fill_price, allowed, holdings)
                             total_open_contracts += allowed
                             cumulative_short_contracts += allowed
-
-            if holdings:
-                trading_data.at[trading_data.index[i], 'Position'] = holdings[0]['position_type']
-                trading_data.at[trading_data.index[i], 'Entry Price'] = holdings[0]['entry_price']
-            else:
-                trading_data.at[trading_data.index[i], 'Position'] = None
-                trading_data.at[trading_data.index[i], 'Entry Price'] = None
-
-            # Update new columns for contract counts.
-            trading_data.at[trading_data.index[i], 'Contracts Held'] = total_open_contracts
-            trading_data.at[trading_data.index[i], 'Cumulative Long'] = cumulative_long_contracts
-            trading_data.at[trading_data.index[i], 'Cumulative Short'] = cumulative_short_contracts
-
-        trading_data['Asset'] = asset_history
-        trading_data['PNL'] = pnl_history
-        trading_data['Cumulative PNL'] = cumulative_pnl_history
+                            short_entries += 1
+
+            if timed:
+                phase_end = perf_counter()
+                stats.add_time('entries', phase_end - phase_start)
+                phase_start = phase_end
+
+            if record:
+                asset_history[i] = asset_value
+                pnl_history[i] = total_realized_pnl
+                cumulative_pnl_history[i] = cumulative_pnl
+                contracts_held_history[i] = total_open_contracts
+                cumulative_long_history[i] = cumulative_long_contracts
+                cumulative_short_history[i] = cumulative_short_contracts
+            if full and holdings:
+                position_codes[i] = self.POSITION_TYPES.index(holdings[0]['position_type'])
+                entry_price_history[i] = holdings[0]['entry_price']
+            if timed:
+                stats.add_time('write_back', perf_counter() - phase_start)
+
+        if timed:
+            phase_start = perf_counter()
+        if record:
+            state = {
+                'Contracts Held': contracts_held_history,
+                'Cumulative Long': cumulative_long_history,
+                'Cumulative Short': cumulative_short_history,
+                'Asset': asset_history,
+                'PNL': pnl_history,
+                'Cumulative PNL': cumulative_pnl_history
+            }
+        else:
+            # Only the final state; an empty frame if no bar survived the indicator warm-up.
+            index = index[-1:]
+            state = {
+                'Contracts Held': [total_open_contracts] * len(index),
+                'Cumulative Long': [cumulative_long_contracts] * len(index),
+                'Cumulative Short': [cumulative_short_contracts] * len(index),
+                'Asset': [asset_value] * len(index),
+                'PNL': [total_realized_pnl] * len(index),
+                'Cumulative PNL': [cumulative_pnl] * len(index)
+            }
+        if full:
+            columns = {name: row_columns[name].astype(np.float32) for name in indicators.columns}
+            columns['Volatility Regime'] = regimes
+            columns.update(state)
+            columns['Position'] = pd.Categorical.from_codes(position_codes, categories=self.POSITION_TYPES)
+            columns['Entry Price'] = entry_price_history
+            trading_data = pd.concat([trading_data[valid], pd.DataFrame(columns, index=index)], axis=1)
+        else:
+            trading_data = pd.DataFrame(state, index=index)
+        if timed:
+            stats.add_time('write_back', perf_counter() - phase_start)
+            stats.count('bars', n_bars)
+            stats.count('long_entries', long_entries)
+            stats.count('short_entries', short_entries)
+            stats.count('scale_ins', scale_ins)
+            stats.count('partial_closes', partial_closes)
+            stats.count('full_exits', full_exits)
 
         return trading_data
 
@@ -0,0 +1,127 @@
+import numpy as np
+
+BUY = 1
+SELL = -1
+
+
+def _refuse_missing(price, filled):
+    """
+    No fill where there is no price (a bar on which an instrument has no data).
+    """
+    if np.ndim(price) == 0:
+        return 0 if np.isnan(price) else filled
+    return np.where(np.isnan(price), 0, filled)
+
+
+class ExecutionModel:
+    def __init__(self):
+        """
+        Instant execution: every order fills completely at the close of the bar it was decided on.
+        This is the behaviour of the original backtest and the default of Backtesting.
+
+        Execution models are prepared once per run with the close and volume arrays, then asked for
+        fills. All arrays may be 1-D (one instrument) or 2-D (bars x instruments, as in
+        PortfolioBacktesting); fill() then works element-wise on the instruments of bar i.
+        A missing close (NaN: an instrument without a bar on a minute of the common index) is
+        never filled.
+        """
+        self.close = None
+        self.volume = None
+
+    def prepare(self, close, volume):
+        """
+        Precompute everything that does not depend on the order size. Returns self.
+        """
+        self.close = close
+        self.volume = volume
+        return self
+
+    def fill(self, i, direction, contracts, used=0, capped=True):
+        """
+        Fill an order decided on bar i.
+
+        Parameters:
+            i (int): Bar of the decision.
+            direction (int or ndarray): BUY (1) or SELL (-1).
+            contracts (int or ndarray): Number of contracts wanted.
+            used (int or ndarray): Contracts already filled on that bar by earlier orders.
+            capped (bool): Whether a volume cap of the model applies. False for orders that must
+                fill in full, like the flattening of an expiring contract on a roll.
+
+        Returns:
+            (fill_price, filled_contracts)
+        """
+        return self.close[i], _refuse_missing(self.close[i], contracts)
+
+
+class SimulatedExecution(ExecutionModel):
+    def __init__(self, latency_bars=0, latency_ms=0, bar_ms=60000, half_spread=0.0, impact=0.0, max_volume_fraction=None):
+        """
+        Execution with latency, slippage and partial fills, precomputed as arrays so a fill is a few
+        array lookups.
+
+        Parameters:
+            latency_bars (int): Whole bars between the decision and the fill. Bars are counted per
+                instrument over the bars where it has a close, so in a portfolio an instrument
+                without data on the next minute of the common index fills on its own next bar.
+            latency_ms (float): Extra latency in milliseconds; the fill price is interpolated
+                between the closes of the surrounding bars.
+            bar_ms (float): Length of one bar in milliseconds (default: 1 minute).
+            half_spread (float): Price paid on top of the reference price per contract (points).
+            impact (float): Extra slippage per contract of order size per contract of bar volume,
+                i.e. slippage = half_spread + impact * contracts / volume.
+            max_volume_fraction (float): Cap of the contracts filled on one bar as a fraction of
+                that bar's traded volume (None: no cap). Orders beyond the cap are partially filled.
+                The unfilled part of an exit stays open; it is only closed on a later bar whose
+                exit condition (stop-loss, take-profit, trailing stop) still holds. Roll flattens
+                are never capped.
+        """
+        super().__init__()
+        self.latency_bars = latency_bars
+        self.latency_ms = latency_ms
+        self.bar_ms = bar_ms
+        self.half_spread = half_spread
+        self.impact = impact
+        self.max_volume_fraction = max_volume_fraction
+
+    @staticmethod
+    def _shifted(values, bars, has_bar):
+        """
+        values moved `bars` bars earlier, repeating the last bar at the end of the series. Only the
+        rows of has_bar count as bars (per column for 2-D values); the other rows are NaN.
+        """
+        values = values.astype(float)
+        if values.ndim == 2:
+            return np.column_stack([
+                SimulatedExecution._shifted(values[:, j], bars, has_bar[:, j]) for j in range(values.shape[1])
+            ]).reshape(values.shape)
+        rows = np.flatnonzero(has_bar)
+        shifted = np.full(len(values), np.nan)
+        if len(rows):
+            shifted[rows] = values[rows[np.minimum(np.arange(len(rows)) + bars, len(rows) - 1)]]
+        return shifted
+
+    def prepare(self, close, volume):
+        super().prepare(close, volume)
+        delay = self.latency_bars + self.latency_ms / self.bar_ms
+        whole = int(np.floor(delay))
+        part = delay - whole
+        has_bar = ~np.isnan(np.asarray(close, dtype=float))
+        self.price = self._shifted(close, whole, has_bar)
+        if part > 0:
+            self.price = (1 - part) * self.price + part * self._shifted(close, whole + 1, has_bar)
+        self.fill_volume = np.nan_to_num(self._shifted(volume, whole, has_bar))
+        if self.max_volume_fraction is None:
+            self.capacity = None
+        else:
+            self.capacity = np.floor(self.fill_volume * self.max_volume_fraction).astype(np.int64)
+        return self
+
+    def fill(self, i, direction, contracts, used=0, capped=True):
+        if self.capacity is None or not capped:
+            filled = contracts
+        else:
+            filled = np.minimum(contracts, np.maximum(self.capacity[i] - used, 0))
+        filled = _refuse_missing(self.price[i], filled)
+        slippage = self.half_spread + self.impact * filled / np.maximum(self.fill_volume[i], 1)
+        return self.price[i] + direction * slippage, filled
@@ -0,0 +1,100 @@
+import cProfile
+import io
+import pstats
+
+
+class BacktestStats:
+    # Phases of Backtesting.run, in execution order
+    PHASES = ('indicators', 'dropna', 'exits', 'entries', 'write_back')
+    # Event counters collected by the main loop
+    COUNTERS = ('bars', 'long_entries', 'short_entries', 'scale_ins', 'partial_closes', 'full_exits')
+
+    def __init__(self):
+        """
+        Container for the instrumentation collected by one Backtesting.run call.
+
+        Attributes:
+            timings (dict): Seconds spent in each phase (see PHASES).
+            counters (dict): Number of events of each kind (see COUNTERS).
+            total_time (float): Wall time of the whole run in seconds.
+            profile (str): Text report of the profiler, if one was requested.
+        """
+        self.timings = {phase: 0.0 for phase in self.PHASES}
+        self.counters = {counter: 0 for counter in self.COUNTERS}
+        self.total_time = 0.0
+        self.profile = None
+
+    def add_time(self, phase, seconds):
+        self.timings[phase] += seconds
+
+    def count(self, counter, n=1):
+        self.counters[counter] += n
+
+    def to_dict(self):
+        """
+        Return the collected stats as a plain dictionary.
+        """
+        return {
+            'timings': dict(self.timings),
+            'counters': dict(self.counters),
+            'total_time': self.total_time,
+            'profile': self.profile
+        }
+
+    def summary(self):
+        """
+        Return a human readable summary of the timings and counters.
+        """
+        lines = [f"Total time: {self.total_time:.4f}s"]
+        for phase in self.PHASES:
+            seconds = self.timings[phase]
+            share = seconds / self.total_time * 100 if self.total_time > 0 else 0.0
+            lines.append(f"  {phase:<12} {seconds:>10.4f}s {share:6.1f}%")
+        for counter in self.COUNTERS:
+            lines.append(f"  {counter:<15} {self.counters[counter]}")
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return f"BacktestStats(total_time={self.total_time:.4f}, counters={self.counters})"
+
+
+class Profiler:
+    BACKENDS = ('cprofile', 'pyinstrument')
+
+    def __init__(self, backend='cprofile', limit=30):
+        """
+        Thin wrapper around cProfile / pyinstrument producing a text report.
+
+        Parameters:
+            backend (str): 'cprofile' or 'pyinstrument' (the latter must be installed).
+            limit (int): Number of cProfile entries kept in the report (default 30).
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown profiler backend '{backend}', expected one of {self.BACKENDS}")
+        self.backend = backend
+        self.limit = limit
+        self._profiler = None
+
+    def start(self):
+        if self.backend == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler as PyinstrumentProfiler
+            except ImportError as e:
+                raise ImportError("The 'pyinstrument' profiler backend requires `pip install pyinstrument`") from e
+            self._profiler = PyinstrumentProfiler()
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self):
+        """
+        Stop profiling and return the text report.
+        """
+        if self.backend == 'pyinstrument':
+            self._profiler.stop()
+            return self._profiler.output_text()
+        self._profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(self._profiler, stream=stream).sort_stats('cumulative').print_stats(self.limit)
+        return stream.getvalue()
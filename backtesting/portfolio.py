@@ -0,0 +1,331 @@
+import numpy as np
+import pandas as pd
+from backtesting.backtesting import Backtesting
+from backtesting.regime import HIGH_VOLATILITY, LOW_VOLATILITY
+
+LONG = 1
+SHORT = -1
+FLAT = 0
+
+
+class PortfolioBacktesting(Backtesting):
+    def __init__(self, max_total_contracts=None, fees=None, margins=None, indicator_cache=False, session_mode=None,
+                 execution=None, independent=False):
+        """
+        Run the scalping strategy on several instruments at once with a shared contract cap and capital.
+
+        Every instrument follows the same state machine as Backtesting.run (at most one position,
+        stop-loss, partial take-profit, trailing stop, scaling in); the state of all instruments is
+        held in arrays and updated together, so there is one Python iteration per bar, not per
+        instrument and bar.
+
+        Parameters:
+            max_total_contracts (int): Contract cap shared by all instruments (default: MAX_TOTAL_CONTRACTS).
+            fees (dict or float): Fee per contract, per symbol or for all (default: TRADING_FEE).
+            margins (dict or float): Margin per contract in the units of asset_value, per symbol or for
+                all. New contracts are only opened while the margin of the open contracts stays within
+                the current asset value. None (default) only applies the contract cap.
+            indicator_cache (bool), session_mode (str), execution (ExecutionModel): See Backtesting.
+                The execution model is prepared with (bars x instruments) arrays and fills the
+                orders of all instruments of a bar at once.
+            independent (bool): Give every instrument its own contract cap, margin and capital
+                instead of sharing them. Every column is then a separate backtest, e.g. one per
+                parameter set on the same data (see optimization/sensitivity.py).
+        """
+        super().__init__(indicator_cache=indicator_cache, session_mode=session_mode, execution=execution)
+        self.max_total_contracts = self.MAX_TOTAL_CONTRACTS if max_total_contracts is None else max_total_contracts
+        self.fees = fees
+        self.margins = margins
+        self.independent = independent
+
+    @staticmethod
+    def _per_symbol(value, symbols, default):
+        """
+        Expand a scalar or a {symbol: value} dictionary into an array aligned with symbols.
+        """
+        if value is None:
+            value = default
+        if isinstance(value, dict):
+            return np.array([value.get(symbol, default) for symbol in symbols], dtype=float)
+        return np.full(len(symbols), value, dtype=float)
+
+    @staticmethod
+    def _allocate(desired, remaining, cost=None, shared=True):
+        """
+        Fill the desired contracts in column order until the remaining budget is used up.
+        Budget and cost are in contracts unless a per-contract cost is given. With shared=False,
+        remaining is a budget per column and the columns do not compete for it.
+        """
+        if cost is None:
+            before = np.cumsum(desired) - desired if shared else 0
+            return np.clip(remaining - before, 0, desired)
+        spent = desired * cost
+        before = np.cumsum(spent) - spent if shared else 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            affordable = np.where(cost > 0, np.floor(np.maximum(remaining - before, 0) / cost), desired)
+        return np.minimum(desired, affordable).astype(np.int64)
+
+    def position_sizes(self, acceleration, regime, acceleration_threshold, direction):
+        """
+        Vectorized calculate_signal_strength_long/short followed by calculate_contracts,
+        from the volatility regime labels of the bars.
+        """
+        if direction == LONG:
+            strength = np.where(acceleration < acceleration_threshold, 0, np.minimum(acceleration / acceleration_threshold, 1))
+        else:
+            strength = np.where(acceleration > -acceleration_threshold, 0, np.minimum(np.abs(acceleration) / acceleration_threshold, 1))
+        base = np.clip(np.rint(strength * 10), 1, 10)
+        high_vol = regime == HIGH_VOLATILITY
+        low_vol = regime == LOW_VOLATILITY
+        adjusted = np.where(high_vol, np.maximum(1, base // 2), np.where(low_vol, np.minimum(10, np.rint(base * 1.2)), base))
+        # Bars without data have no size; they never pass the entry signal anyway.
+        return np.nan_to_num(adjusted, nan=0).astype(np.int64)
+
+    def entry_signals(self, ind, params, direction):
+        """
+        Vectorized check_long_position_conditions / check_short_position_conditions over
+        (bars x instruments) indicator matrices.
+        """
+        acceleration_threshold = params['acceleration_threshold']
+        quantity_multiply = params['quantity_multiply']
+        sma_gap = params['sma_gap']
+        short_acceleration_threshold = params['short_acceleration_threshold']
+        rsi_threshold = params['rsi_threshold']
+        volume_spike = ind['volume'] > ind['Average Quantity'] * quantity_multiply
+        if direction == LONG:
+            conditions = [
+                ind['Acceleration'] > acceleration_threshold,
+                ind['VN30 Acceleration'] > 0,
+                volume_spike,
+                ind['Price/SMA'] < 1 - sma_gap,
+                ind['Short Acceleration'] > short_acceleration_threshold,
+                ind['RSI'] < 50 - rsi_threshold
+            ]
+        else:
+            conditions = [
+                ind['Acceleration'] < -acceleration_threshold,
+                ind['VN30 Acceleration'] < 0,
+                volume_spike,
+                ind['Price/SMA'] > 1 + sma_gap,
+                ind['Short Acceleration'] < -short_acceleration_threshold,
+                ind['RSI'] > 50 + rsi_threshold
+            ]
+        return np.sum(conditions, axis=0) >= len(conditions) - 2
+
+    def run(self, instruments, params, asset_value=10000):
+        """
+        Run the strategy on every instrument on a common minute index.
+
+        Parameters:
+            instruments (dict): symbol -> DataFrame with 'high', 'low', 'close', 'volume' and 'vn30'
+                columns (and the 'Roll' markers of a continuous series, if any) and a datetime index. Instruments are aligned on the union of their indexes;
+                an instrument takes no decision on bars where it has no data or its indicators are
+                still warming up, but its open position is carried. In 'reset' session mode the
+                warm-up of every session only blocks entries, as in Backtesting.run.
+            params (dict): Strategy parameters as in Backtesting.run, either one dictionary for all
+                instruments or a dictionary of them keyed by symbol.
+            asset_value (float): Shared starting capital (of every instrument when independent).
+
+        Returns a DataFrame on the common index with the portfolio 'Contracts Held',
+        'Cumulative Long', 'Cumulative Short', 'Asset', 'PNL', 'Cumulative PNL' and 'Margin Used'
+        columns, plus 'PNL <symbol>' and 'Contracts Held <symbol>' for every instrument. When
+        independent, 'Asset' is the sum of the capital of all instruments.
+        """
+        symbols = list(instruments)
+        per_symbol_params = [params[symbol] if symbol in params else params for symbol in symbols]
+        index = instruments[symbols[0]].index
+        for symbol in symbols[1:]:
+            index = index.union(instruments[symbol].index)
+
+        # (bars x instruments) matrices of the inputs and indicators.
+        # Like Backtesting.run, present bars run the exits and ready bars (indicators warmed up)
+        # may also enter; they only differ in 'reset' session mode, where session warm-ups block
+        # entries but not exits.
+        columns = {}
+        present = np.empty((len(index), len(symbols)), dtype=bool)
+        ready = np.empty((len(index), len(symbols)), dtype=bool)
+        # Contract roll markers of continuous series (data/continuous.py), per instrument.
+        roll = np.zeros((len(index), len(symbols)), dtype=bool)
+        for j, (symbol, instrument_params) in enumerate(zip(symbols, per_symbol_params)):
+            data = instruments[symbol]
+            indicators = self.build_indicators(data, instrument_params)
+            input_valid = data.notna().all(axis=1)
+            instrument_ready = indicators.notna().all(axis=1)
+            if self.session_mode == 'reset':
+                instrument_present = input_valid & (instrument_ready.cumsum() > 0)
+            else:
+                instrument_present = input_valid & instrument_ready
+            present[:, j] = instrument_present.reindex(index, fill_value=False).to_numpy()
+            ready[:, j] = (instrument_present & instrument_ready).reindex(index, fill_value=False).to_numpy()
+            if 'Roll' in data:
+                roll[:, j] = (instrument_present & data['Roll'].astype(bool)).reindex(index, fill_value=False).to_numpy()
+            regime = self.volatility_regimes(data, indicators, instrument_params)
+            frame = indicators.assign(close=data['close'], volume=data['volume'], regime=regime).reindex(index)
+            for name in frame.columns:
+                columns.setdefault(name, np.empty((len(index), len(symbols))))[:, j] = frame[name].to_numpy()
+
+        def param_array(name):
+            return np.array([p[name] for p in per_symbol_params], dtype=float)
+
+        matrix_params = {
+            name: param_array(name)
+            for name in ('acceleration_threshold', 'quantity_multiply', 'sma_gap', 'short_acceleration_threshold', 'rsi_threshold')
+        }
+        take_profit_threshold = param_array('take_profit_threshold')
+        cut_loss_threshold = param_array('cut_loss_threshold')
+        short_extra_profit = param_array('short_extra_profit')
+        fees = self._per_symbol(self.fees, symbols, self.TRADING_FEE)
+        margins = None if self.margins is None else self._per_symbol(self.margins, symbols, 0.0)
+        shared = not self.independent
+        if not shared:
+            asset_value = np.full(len(symbols), float(asset_value))
+
+        # Entry decisions only depend on the indicators, so they are computed for all bars up front.
+        # No entry is taken on the last bar of a contract.
+        long_signal = self.entry_signals(columns, matrix_params, LONG) & ready & ~roll
+        short_signal = self.entry_signals(columns, matrix_params, SHORT) & ready & ~roll
+        long_size = self.position_sizes(columns['Acceleration'], columns['regime'], matrix_params['acceleration_threshold'], LONG)
+        short_size = self.position_sizes(columns['Acceleration'], columns['regime'], matrix_params['acceleration_threshold'], SHORT)
+        close = columns['close']
+        atr = columns['ATR']
+        execution = self.execution.prepare(close, columns['volume'])
+
+        n_bars, n_instruments = close.shape
+        side = np.zeros(n_instruments, dtype=np.int64)
+        entry_price = np.zeros(n_instruments)
+        contracts = np.zeros(n_instruments, dtype=np.int64)
+        has_partial_exited = np.zeros(n_instruments, dtype=bool)
+        trailing_stop = np.full(n_instruments, np.nan)
+        cumulative_long_contracts = 0
+        cumulative_short_contracts = 0
+
+        pnl_history = np.zeros((n_bars, n_instruments))
+        contracts_history = np.zeros((n_bars, n_instruments), dtype=np.int16)
+        cumulative_long_history = np.empty(n_bars, dtype=np.int32)
+        cumulative_short_history = np.empty(n_bars, dtype=np.int32)
+        asset_history = np.empty(n_bars)
+
+        for i in range(n_bars):
+            price = close[i]
+            active = present[i]
+            is_long = active & (side == LONG)
+            is_short = active & (side == SHORT)
+            realized = np.zeros(n_instruments)
+            bar_filled = np.zeros(n_instruments, dtype=np.int64)
+
+            # -------------------------
+            # EXIT STRATEGY
+            # -------------------------
+            stop_loss = (is_long & (price < entry_price - cut_loss_threshold)) | (is_short & (price > entry_price + cut_loss_threshold))
+
+            take_profit = ~stop_loss & ~has_partial_exited & (
+                (is_long & (price >= entry_price + take_profit_threshold))
+                | (is_short & (price <= entry_price - (take_profit_threshold + short_extra_profit)))
+            )
+            if take_profit.any():
+                wanted = np.maximum(1, np.rint(contracts * 0.5)).astype(np.int64) * take_profit
+                fill_price, closed = execution.fill(i, -side, wanted, bar_filled)
+                # A partial exit only counts once some contracts are filled.
+                take_profit &= closed > 0
+                closed = np.where(take_profit, closed, 0)
+                realized += np.where(take_profit, side * (fill_price - entry_price) * closed - fees * closed, 0)
+                contracts -= closed
+                bar_filled += closed
+                has_partial_exited |= take_profit
+                trailing_stop = np.where(take_profit, entry_price + side * take_profit_threshold, trailing_stop)
+
+            trailing = has_partial_exited & ~stop_loss & (is_long | is_short)
+            trailing_exit = trailing & (
+                (is_long & (price < trailing_stop)) | (is_short & (price > trailing_stop))
+            )
+            full_exit = stop_loss | trailing_exit
+            if full_exit.any():
+                fill_price, closed = execution.fill(i, -side, contracts, bar_filled)
+                closed = np.where(full_exit, closed, 0)
+                # Unfilled exits (no price on that bar) realize nothing.
+                realized += np.where(closed > 0, side * (fill_price - entry_price) * closed - fees * closed, 0)
+                contracts -= closed
+                bar_filled += closed
+                # Positions whose exit was capped by the bar volume stay open with the rest.
+                flattened = full_exit & (contracts == 0)
+                side[flattened] = FLAT
+                has_partial_exited[flattened] = False
+                trailing_stop[flattened] = np.nan
+
+            trailing &= ~trailing_exit
+            if trailing.any():
+                trail_distance = self.TRAIL_MULTIPLIER * atr[i]
+                trailing_stop = np.where(trailing & is_long, np.fmax(trailing_stop, price - trail_distance), trailing_stop)
+                trailing_stop = np.where(trailing & is_short, np.fmin(trailing_stop, price + trail_distance), trailing_stop)
+
+            # Every position of an instrument is flattened on the last bar of its contract, in full
+            # whatever the bar volume: the contract expires.
+            rolling = roll[i] & (contracts > 0)
+            if rolling.any():
+                fill_price, closed = execution.fill(i, -side, contracts, bar_filled, capped=False)
+                closed = np.where(rolling, closed, 0)
+                realized += np.where(closed > 0, side * (fill_price - entry_price) * closed - fees * closed, 0)
+                contracts -= closed
+                bar_filled += closed
+                flattened = rolling & (contracts == 0)
+                side[flattened] = FLAT
+                has_partial_exited[flattened] = False
+                trailing_stop[flattened] = np.nan
+
+            asset_value += realized.sum() if shared else realized
+
+            # -------------------------
+            # ENTRY STRATEGY
+            # -------------------------
+            for direction, signal, size in ((LONG, long_signal[i], long_size[i]), (SHORT, short_signal[i], short_size[i])):
+                candidates = signal & (side != -direction)
+                if not candidates.any():
+                    continue
+                desired = np.where(candidates, size, 0)
+                if shared:
+                    allowed = self._allocate(desired, self.max_total_contracts - contracts.sum())
+                    if margins is not None:
+                        allowed = self._allocate(allowed, asset_value - (contracts * margins).sum(), margins)
+                else:
+                    allowed = self._allocate(desired, self.max_total_contracts - contracts, shared=False)
+                    if margins is not None:
+                        allowed = self._allocate(allowed, asset_value - contracts * margins, margins, shared=False)
+                fill_price, allowed = execution.fill(i, direction, allowed, bar_filled)
+                opened = allowed > 0
+                if not opened.any():
+                    continue
+                bar_filled += allowed
+                total_after = contracts + allowed
+                # Weighted average entry price when scaling in, the fill price for new positions.
+                scaled = opened & (side == direction)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    averaged = (entry_price * contracts + fill_price * allowed) / total_after
+                entry_price = np.where(scaled, averaged, np.where(opened, fill_price, entry_price))
+                contracts = total_after
+                side[opened] = direction
+                if direction == LONG:
+                    cumulative_long_contracts += int(allowed.sum())
+                else:
+                    cumulative_short_contracts += int(allowed.sum())
+
+            pnl_history[i] = realized
+            contracts_history[i] = contracts
+            cumulative_long_history[i] = cumulative_long_contracts
+            cumulative_short_history[i] = cumulative_short_contracts
+            asset_history[i] = np.sum(asset_value)
+
+        pnl = pnl_history.sum(axis=1)
+        result = {
+            'Contracts Held': contracts_history.sum(axis=1, dtype=np.int16),
+            'Cumulative Long': cumulative_long_history,
+            'Cumulative Short': cumulative_short_history,
+            'Asset': asset_history,
+            'PNL': pnl,
+            'Cumulative PNL': pnl.cumsum()
+        }
+        if margins is not None:
+            result['Margin Used'] = contracts_history @ margins
+        for j, symbol in enumerate(symbols):
+            result[f'PNL {symbol}'] = pnl_history[:, j]
+            result[f'Contracts Held {symbol}'] = contracts_history[:, j]
+        return pd.DataFrame(result, index=index)
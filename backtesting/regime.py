@@ -0,0 +1,68 @@
+import numpy as np
+
+# Volatility regime labels.
+LOW_VOLATILITY = -1
+NORMAL_VOLATILITY = 0
+HIGH_VOLATILITY = 1
+
+# Strategy parameters of the percentile regimes; without them the fixed ATR baseline is used.
+REGIME_PARAMS = ('regime_window', 'regime_low_percentile', 'regime_high_percentile')
+
+
+class VolatilityRegime:
+    def __init__(self, window=None, low_percentile=None, high_percentile=None, baseline=1.0):
+        """
+        Label every bar of an ATR series as low, normal or high volatility, for the whole series at once.
+
+        Parameters:
+            window (int): Number of bars of the rolling percentile. None: compare the ATR with the
+                fixed baseline instead (high above 1.5 x baseline, low below 0.5 x baseline), the
+                original behaviour of calculate_contracts.
+            low_percentile (float): A bar is low volatility when its ATR ranks below this fraction
+                of the ATRs of the last `window` bars (itself included, so no lookahead).
+            high_percentile (float): A bar is high volatility when its ATR ranks above this fraction.
+            baseline (float): ATR baseline of the fixed thresholds.
+
+        Bars without a rank (missing ATR, or fewer than half a window of ATRs so far) are normal
+        volatility.
+        """
+        self.window = window
+        self.low_percentile = low_percentile
+        self.high_percentile = high_percentile
+        self.baseline = baseline
+
+    @classmethod
+    def from_params(cls, params, baseline=1.0):
+        """
+        Percentile regimes when params has every REGIME_PARAMS entry, otherwise the fixed baseline.
+        """
+        if not all(params.get(name) is not None for name in REGIME_PARAMS):
+            return cls(baseline=baseline)
+        return cls(int(params['regime_window']), params['regime_low_percentile'], params['regime_high_percentile'], baseline)
+
+    @staticmethod
+    def percentile_rank(atr, window):
+        """
+        Rank of each ATR among the last `window` ATRs, as a fraction in (0, 1].
+        Missing ATRs inside the window (e.g. the session warm-ups masked in 'reset' session mode)
+        are skipped; a rank needs at least half a window of values.
+        """
+        return atr.rolling(window, min_periods=max(1, window // 2)).rank(pct=True)
+
+    def labels(self, atr, rank=None):
+        """
+        Regime label (int8) of every bar.
+
+        Parameters:
+            atr (Series): ATR of every bar.
+            rank (Series): Precomputed percentile_rank(atr, self.window), e.g. from the indicator cache.
+        """
+        if self.window is None:
+            high = atr.to_numpy() > self.baseline * 1.5
+            low = atr.to_numpy() < self.baseline * 0.5
+        else:
+            if rank is None:
+                rank = self.percentile_rank(atr, self.window)
+            high = rank.to_numpy() > self.high_percentile
+            low = rank.to_numpy() < self.low_percentile
+        return np.where(high, HIGH_VOLATILITY, np.where(low, LOW_VOLATILITY, NORMAL_VOLATILITY)).astype(np.int8)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+# Minutes after midnight splitting the morning (09:15-11:30) and afternoon (13:00-14:30) sessions.
+LUNCH_BREAK = 12 * 60
+
+
+class Sessions:
+    def __init__(self, timestamps):
+        """
+        Session ids of a minute series, computed once with array operations.
+
+        Attributes:
+            starts (ndarray): True on the first bar of every session.
+            ids (ndarray): Session number of every bar.
+            position (ndarray): Number of bars since the start of the bar's session (0 on the first bar).
+        """
+        values = pd.DatetimeIndex(timestamps).values
+        days = values.astype('datetime64[D]')
+        minutes = (values - days).astype('timedelta64[m]').astype(np.int64)
+        key = days.astype(np.int64) * 2 + (minutes >= LUNCH_BREAK)
+        self.starts = np.r_[True, key[1:] != key[:-1]] if len(key) else np.zeros(0, dtype=bool)
+        self.ids = np.cumsum(self.starts) - 1
+        self.position = np.arange(len(key)) - np.flatnonzero(self.starts)[self.ids]
+
+    @classmethod
+    def of(cls, data):
+        """
+        Sessions of a trading DataFrame, from its DatetimeIndex or its 'datetime' column.
+        """
+        if isinstance(data.index, pd.DatetimeIndex):
+            return cls(data.index)
+        return cls(pd.to_datetime(data['datetime']))
+
+    def reset(self, series, lookback):
+        """
+        Drop the values whose window of lookback earlier bars reaches into a previous session.
+        """
+        return series.where(self.position >= lookback)
+
+    def bridge(self, data):
+        """
+        Remove the gaps at the session opens from the price columns.
+
+        The gap of a session is the first bar's 'open' minus the previous bar's 'close' (the whole
+        first-bar move for 'vn30', which has no open). Every bar is shifted down by the sum of the
+        gaps so far, so windows can run across sessions without seeing the jumps.
+
+        Returns the bridged copy of the price and volume columns and the cumulative gap of 'close'.
+        """
+        opens = data['open'] if 'open' in data else data['close']
+        close_gap = np.where(self.starts, opens - data['close'].shift(1), 0)
+        vn30_gap = np.where(self.starts, data['vn30'].diff(), 0)
+        # No gap before the first bar.
+        close_gap[:1] = 0
+        vn30_gap[:1] = 0
+        close_level = pd.Series(np.cumsum(close_gap), index=data.index)
+        bridged = pd.DataFrame({
+            'high': data['high'] - close_level,
+            'low': data['low'] - close_level,
+            'close': data['close'] - close_level,
+            'volume': data['volume'],
+            'vn30': data['vn30'] - np.cumsum(vn30_gap)
+        }, index=data.index)
+        return bridged, close_level
@@ -0,0 +1,212 @@
+"""
+Non-interactive batch backtesting.
+
+Runs every combination of parameter sets x data ranges on a process pool, writes the metrics of each
+run (metrics.csv / metrics.json) and headless PNG or HTML plots to the output directory, and prints
+a summary table with the startup and wall times.
+
+Examples:
+    python batch.py --params optimization/best_params.json --data data/train.csv data/test.csv
+    python batch.py --study sma_v2 --storage sqlite:///sma.db --top 100 --data data/test.csv --jobs 8
+    python batch.py --params a.json b.json --data data/test.csv --range 2024-01-01:2024-02-29 2024-03-01: --plots html
+"""
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import base64
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+# Headless: no window is ever opened, figures are only written to files.
+matplotlib.use("Agg")
+import pandas as pd
+from backtesting.backtesting import Backtesting
+from data.dataset import normalize
+from performance.metric import Metric
+from performance.store import RunStore
+
+PLOT_FORMATS = ('none', 'png', 'html')
+
+# Per-worker state, set by _init_worker.
+_worker = {}
+
+
+def load_param_sets(param_files):
+    """
+    Load (name, params) pairs from JSON files holding one parameter dictionary or a list of them.
+    """
+    param_sets = []
+    for path in param_files:
+        with open(path, "r") as f:
+            loaded = json.load(f)
+        name = os.path.splitext(os.path.basename(path))[0]
+        if isinstance(loaded, list):
+            param_sets.extend((f"{name}_{i}", params) for i, params in enumerate(loaded))
+        else:
+            param_sets.append((name, loaded))
+    return param_sets
+
+
+def load_study_param_sets(study_name, storage, top):
+    """
+    Load (name, params) pairs of the `top` best completed trials of an Optuna study.
+    """
+    import optuna
+    study = optuna.load_study(study_name=study_name, storage=storage)
+    trials = [t for t in study.trials if t.state == optuna.trial.TrialState.COMPLETE and t.value is not None]
+    reverse = study.direction == optuna.study.StudyDirection.MAXIMIZE
+    trials.sort(key=lambda t: t.value, reverse=reverse)
+    return [(f"{study_name}_trial{t.number}", t.params) for t in trials[:top]]
+
+
+def parse_range(text):
+    """
+    'START:END' -> (start, end); either side may be empty for an open range.
+    """
+    start, _, end = text.partition(':')
+    return start or None, end or None
+
+
+def read_data(path):
+    # Normalized like the datasets, so stored runs are shared with the dataset of the same bars.
+    return normalize(pd.read_csv(path))
+
+
+def _init_worker(data_paths, asset_value, out_dir, plots, store_root):
+    _worker['data'] = {path: read_data(path) for path in data_paths}
+    _worker['slices'] = {}
+    _worker['backtester'] = Backtesting(indicator_cache=True)
+    _worker['asset_value'] = asset_value
+    _worker['out_dir'] = out_dir
+    _worker['plots'] = plots
+    _worker['store'] = RunStore(store_root) if store_root else None
+
+
+def _data_slice(path, start, end):
+    # Reuse the same DataFrame object for every run of a range, so the indicator cache is kept.
+    key = (path, start, end)
+    if key not in _worker['slices']:
+        data = _worker['data'][path]
+        _worker['slices'][key] = data.loc[start:end] if start or end else data
+    return _worker['slices'][key]
+
+
+def _html_report(run, metrics, png_path):
+    with open(png_path, "rb") as f:
+        image = base64.b64encode(f.read()).decode()
+    rows = "".join(f"<tr><th>{key}</th><td>{value}</td></tr>" for key, value in metrics.items())
+    params = "".join(f"<tr><th>{key}</th><td>{value}</td></tr>" for key, value in run['params'].items())
+    return (
+        f"<html><head><meta charset='utf-8'><title>{run['name']}</title></head><body>"
+        f"<h1>{run['name']}</h1><h2>Metrics</h2><table>{rows}</table>"
+        f"<h2>Parameters</h2><table>{params}</table>"
+        f"<h2>Cumulative PNL</h2><img src='data:image/png;base64,{image}'/></body></html>"
+    )
+
+
+def _run_one(run):
+    start = time.perf_counter()
+    data = _data_slice(run['data'], run['start'], run['end'])
+    if _worker['store'] is not None:
+        result = _worker['store'].run(_worker['backtester'], data, run['params'], _worker['asset_value'])
+    else:
+        result = _worker['backtester'].run(data, run['params'], _worker['asset_value'], result_shape='summary')
+
+    metric = Metric(result)
+    metrics = {'Run': run['name'], 'Params': run['params_name'], 'Data': run['data'],
+               'Start': run['start'], 'End': run['end'], 'Bars': len(result)}
+    if len(result):
+        metrics.update(metric.calculate_metrics())
+        metrics['Final PNL'] = result['Cumulative PNL'].iloc[-1]
+
+    if _worker['plots'] != 'none' and len(result):
+        png_path = os.path.join(_worker['out_dir'], f"{run['name']}.png")
+        metric.plot_pnl(save_path=png_path)
+        if _worker['plots'] == 'html':
+            with open(os.path.join(_worker['out_dir'], f"{run['name']}.html"), "w") as f:
+                f.write(_html_report(run, metrics, png_path))
+    metrics['Seconds'] = time.perf_counter() - start
+    return metrics
+
+
+def build_runs(param_sets, data_paths, ranges):
+    """
+    One run per (parameter set, data file, range), ordered so a worker sees the runs of the same
+    data slice one after another.
+    """
+    runs = []
+    for path in data_paths:
+        for start, end in ranges:
+            for params_name, params in param_sets:
+                data_name = os.path.splitext(os.path.basename(path))[0]
+                range_name = f"_{start or ''}_{end or ''}" if start or end else ""
+                runs.append({
+                    'name': f"{len(runs):04d}_{params_name}_{data_name}{range_name}",
+                    'params_name': params_name,
+                    'params': params,
+                    'data': path,
+                    'start': start,
+                    'end': end
+                })
+    return runs
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run many backtests in parallel, without any prompt or window.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--params", nargs="+", help="JSON files with a parameter dictionary or a list of them.")
+    source.add_argument("--study", help="Name of an Optuna study whose best trials are backtested.")
+    parser.add_argument("--storage", default="sqlite:///sma.db", help="Storage URL of the Optuna study.")
+    parser.add_argument("--top", type=int, default=10, help="Number of best trials taken from the study.")
+    parser.add_argument("--data", nargs="+", default=["data/test.csv"], help="CSV files to backtest on.")
+    parser.add_argument("--range", nargs="+", default=[":"], dest="ranges",
+                        help="Date ranges START:END (either side may be empty), applied to every data file.")
+    parser.add_argument("--asset-value", type=float, default=15000)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Worker processes.")
+    parser.add_argument("--out", default="batch_output", help="Output directory.")
+    parser.add_argument("--plots", choices=PLOT_FORMATS, default='png', help="Plot of the cumulative PNL per run.")
+    parser.add_argument("--store", help="Optional run store directory: runs already in it are not recomputed.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.params:
+        param_sets = load_param_sets(args.params)
+    else:
+        param_sets = load_study_param_sets(args.study, args.storage, args.top)
+    ranges = [parse_range(text) for text in args.ranges]
+    runs = build_runs(param_sets, args.data, ranges)
+    os.makedirs(args.out, exist_ok=True)
+
+    jobs = max(1, min(args.jobs, len(runs)))
+    initargs = (args.data, args.asset_value, args.out, args.plots, args.store)
+    startup = time.perf_counter() - STARTED
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=initargs) as executor:
+        rows = list(executor.map(_run_one, runs, chunksize=max(1, len(runs) // (jobs * 4))))
+    wall = time.perf_counter() - start
+
+    summary = pd.DataFrame(rows)
+    summary.to_csv(os.path.join(args.out, "metrics.csv"), index=False)
+    with open(os.path.join(args.out, "metrics.json"), "w") as f:
+        json.dump(rows, f, indent=4, default=str)
+
+    columns = [c for c in ['Run', 'Sharpe Ratio', 'Maximum Drawdown', 'Win Rate', 'Total Long Trades',
+                           'Total Short Trades', 'Final PNL', 'Seconds'] if c in summary]
+    table = summary[columns]
+    if 'Sharpe Ratio' in table:
+        table = table.sort_values('Sharpe Ratio', ascending=False)
+    print(table.to_string(index=False))
+    print(f"\n{len(runs)} backtests on {jobs} processes")
+    print(f"Startup time: {startup:.2f}s")
+    print(f"Wall time: {wall:.2f}s ({wall / len(runs):.3f}s per backtest)")
+    print(f"Total time: {time.perf_counter() - STARTED:.2f}s")
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from data.query import ROLL_CALENDAR_QUERY
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+
+
+class RollCalendar:
+    CACHE_PATH = "data/cache/roll_calendar.csv"
+
+    def __init__(self, calendar):
+        """
+        Roll calendar of the VN30F1M continuous series.
+
+        Parameters:
+            calendar (DataFrame): One row per roll, indexed by the first trading date of the new
+                front-month contract, with the columns 'old_ticker', 'new_ticker', 'old_close' and
+                'new_close' (closes of both contracts on the last trading date of the old one).
+        """
+        self.calendar = calendar.sort_index()
+
+    @classmethod
+    def from_daily_closes(cls, daily):
+        """
+        Build the calendar from the rows of ROLL_CALENDAR_QUERY (datetime, futurecode, tickersymbol, price).
+        """
+        daily = pd.DataFrame(daily, columns=['datetime', 'futurecode', 'tickersymbol', 'price'])
+        daily['datetime'] = pd.to_datetime(daily['datetime'])
+        daily = daily.astype({'price': float})
+        front = daily[daily['futurecode'] == 'VN30F1M'].set_index('datetime').sort_index()
+        following = daily[daily['futurecode'] == 'VN30F2M'].set_index('datetime').sort_index()
+
+        previous_ticker = front['tickersymbol'].shift(1)
+        is_roll = previous_ticker.notna() & (front['tickersymbol'] != previous_ticker)
+        previous_day = front.index.to_series().shift(1)[is_roll]
+
+        calendar = pd.DataFrame({
+            'old_ticker': previous_ticker[is_roll],
+            'new_ticker': front['tickersymbol'][is_roll],
+            'old_close': front['price'].reindex(previous_day).to_numpy(),
+            'new_close': following['price'].reindex(previous_day).to_numpy(),
+        }, index=front.index[is_roll])
+        # The next-month close is only the new contract's close if it really was the next contract.
+        matches = following['tickersymbol'].reindex(previous_day).to_numpy() == calendar['new_ticker'].to_numpy()
+        calendar.loc[~matches, 'new_close'] = np.nan
+        return cls(calendar)
+
+    @classmethod
+    def load(cls, data_service, start_date, end_date, cache_path=CACHE_PATH, refresh=False):
+        """
+        Load the calendar from the CSV cache, or fetch it once from the database and cache it.
+        The fetched date range is kept in a JSON file next to the CSV; the calendar is
+        refetched when that range does not cover [start_date, end_date] or refresh is True,
+        over both ranges together so the cache never shrinks.
+        """
+        range_path = os.path.splitext(cache_path)[0] + '.json'
+        if os.path.exists(cache_path) and os.path.exists(range_path):
+            with open(range_path, 'r') as f:
+                covered = json.load(f)
+            if not refresh and covered['start_date'] <= start_date and covered['end_date'] >= end_date:
+                return cls(pd.read_csv(cache_path, index_col=0, parse_dates=True))
+            # One query over the whole span: a roll is only detected from the day before it.
+            start_date = min(start_date, covered['start_date'])
+            end_date = max(end_date, covered['end_date'])
+
+        daily = data_service.execute_query(ROLL_CALENDAR_QUERY, start_date, end_date)
+        if daily is None:
+            raise RuntimeError("Could not fetch the roll calendar from the database.")
+        roll_calendar = cls.from_daily_closes(daily)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        roll_calendar.calendar.to_csv(cache_path)
+        with open(range_path, 'w') as f:
+            json.dump({'start_date': start_date, 'end_date': end_date}, f, indent=4)
+        return roll_calendar
+
+
+class ContinuousContractBuilder:
+    METHODS = ('difference', 'ratio')
+
+    def __init__(self, roll_calendar, method='difference'):
+        """
+        Back-adjust a front-month minute series so it has no jumps at the contract rolls.
+
+        Parameters:
+            roll_calendar (RollCalendar): The rolls to adjust for.
+            method (str): 'difference' adds the roll gaps (new close - old close) to every earlier bar;
+                'ratio' multiplies earlier bars by new close / old close. The latest contract of the
+                data is left unadjusted: rolls after its last bar are ignored, so the result does not
+                depend on how far the calendar reaches.
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown method '{method}', expected one of {self.METHODS}")
+        self.roll_calendar = roll_calendar
+        self.method = method
+
+    def build(self, data):
+        """
+        Return a copy of data (datetime index, 'open', 'high', 'low', 'close' columns) with adjusted
+        prices and a boolean 'Roll' column that is True on the last bar of every contract before a roll.
+
+        Rolls whose new contract close is unknown are adjusted with the gap between the last bar of
+        the old contract and the first bar of the new one.
+        """
+        calendar = self.roll_calendar.calendar
+        roll_dates = calendar.index.values.astype('datetime64[D]')
+        bar_dates = data.index.values.astype('datetime64[D]')
+        # Number of rolls on or before each bar: bars with the same count belong to the same contract.
+        segment = np.searchsorted(roll_dates, bar_dates, side='right')
+
+        close = data['close'].to_numpy()
+        first_bar = np.searchsorted(bar_dates, roll_dates, side='left')
+        in_range = (first_bar > 0) & (first_bar < len(close))
+        old_close = calendar['old_close'].to_numpy(dtype=float)
+        new_close = calendar['new_close'].to_numpy(dtype=float)
+        # Rolls after the last bar do not adjust anything.
+        after_data = first_bar >= len(close)
+        fallback = np.isnan(old_close) | np.isnan(new_close)
+        old_close = np.where(fallback & in_range, close[np.clip(first_bar - 1, 0, len(close) - 1)], old_close)
+        new_close = np.where(fallback & in_range, close[np.clip(first_bar, 0, len(close) - 1)], new_close)
+
+        if self.method == 'difference':
+            gaps = np.where(after_data, 0.0, np.nan_to_num(new_close - old_close))
+            # Adjustment of a bar = sum of the gaps of every later roll.
+            adjustment = np.r_[np.cumsum(gaps[::-1])[::-1], 0.0][segment]
+        else:
+            ratios = np.where(after_data, 1.0, np.nan_to_num(new_close / old_close, nan=1.0))
+            adjustment = np.r_[np.cumprod(ratios[::-1])[::-1], 1.0][segment]
+
+        adjusted = data.copy()
+        for column in PRICE_COLUMNS:
+            if column in adjusted:
+                prices = adjusted[column].to_numpy(dtype=float)
+                adjusted[column] = prices + adjustment if self.method == 'difference' else prices * adjustment
+        adjusted['Roll'] = np.r_[segment[1:] != segment[:-1], False]
+        return adjusted
@@ -0,0 +1,279 @@
+"""
+Versioned, content-hashed train/test datasets.
+
+A dataset is a directory <root>/<dataset_id>/ holding one zstd Parquet file per split and a
+manifest.json (date ranges, split spec, rows, columns and content hash of every split). The id
+is '<name>-<hash of the content>': the same data always gets the same id, and building it again
+writes nothing. <root>/index.json maps every name to its latest id, so a dataset can be loaded
+by name or by id.
+
+Building pulls the bars through a per-month Parquet cache of DataService.get_data, so only the
+months missing from the cache (and the current month) touch the network.
+
+    python -m data.dataset import --name vn30f1m --split train=data/train.csv test=data/test.csv
+    python -m data.dataset build --name vn30f1m --start 2023-01-01 --end 2024-04-30 \\
+        --split train=2023-01-01:2023-12-31 test=2024-01-01:2024-04-30
+"""
+import argparse
+import hashlib
+import json
+import os
+from datetime import date, datetime
+import pandas as pd
+
+DATASET_ROOT = "data/datasets"
+MONTH_CACHE = "data/cache/bars"
+BAR_COLUMNS = ['datetime', 'open', 'high', 'low', 'close', 'volume', 'vn30']
+
+
+def content_hash(data):
+    """
+    Hash of the values and index of a DataFrame in dataset form (see normalize), so the same bars
+    hash alike whether they were read from a CSV file, loaded from a dataset or built in memory.
+    The one data hash of the project: datasets, the run store and the trial cache all use it.
+    """
+    if not is_normalized(data):
+        data = normalize(data)
+    row_hashes = pd.util.hash_pandas_object(data, index=True).to_numpy()
+    columns = ",".join(map(str, data.columns)).encode()
+    return hashlib.sha256(row_hashes.tobytes() + columns).hexdigest()
+
+
+def is_normalized(data):
+    """
+    Whether data is already in the form normalize() returns (checked cheaply, without sorting).
+    """
+    return ('datetime' in data and pd.api.types.is_datetime64_dtype(data['datetime'])
+            and isinstance(data.index, pd.DatetimeIndex) and data.index.name == 'datetime')
+
+
+def normalize(data):
+    """
+    Bars in dataset form: a 'datetime' column (datetime64) and the same values as index,
+    sorted by time (stable, so duplicate minutes keep their order).
+    """
+    data = data.copy()
+    if 'datetime' not in data:
+        data.insert(0, 'datetime', data.index)
+    data['datetime'] = pd.to_datetime(data['datetime'])
+    data.index.name = None
+    data = data.sort_values('datetime', kind='stable')
+    data.index = pd.DatetimeIndex(data['datetime'].to_numpy(), name='datetime')
+    return data
+
+
+def read_split(source, split):
+    """
+    Load one split from a CSV path (as data/train.csv), a dataset id or name, or pass a DataFrame through.
+    CSV files are normalized, so they match the dataset imported from them bar for bar.
+    """
+    if isinstance(source, pd.DataFrame):
+        return source
+    if str(source).endswith('.csv'):
+        return normalize(pd.read_csv(source))
+    return load_dataset(source, split)
+
+
+def resolve(dataset_id, root=DATASET_ROOT):
+    """
+    Id of a dataset given its id or its name (latest build of that name).
+    """
+    if os.path.isdir(os.path.join(root, dataset_id)):
+        return dataset_id
+    index_path = os.path.join(root, "index.json")
+    if os.path.exists(index_path):
+        with open(index_path, "r") as f:
+            index = json.load(f)
+        if dataset_id in index:
+            return index[dataset_id]
+    raise KeyError(f"Unknown dataset '{dataset_id}' in {root}")
+
+
+def load_manifest(dataset_id, root=DATASET_ROOT):
+    with open(os.path.join(root, resolve(dataset_id, root), "manifest.json"), "r") as f:
+        return json.load(f)
+
+
+def load_dataset(dataset_id, split, root=DATASET_ROOT):
+    """
+    Load one split of a dataset (by id or name) as a DataFrame indexed by datetime.
+    """
+    dataset_id = resolve(dataset_id, root)
+    manifest = load_manifest(dataset_id, root)
+    if split not in manifest['splits']:
+        raise KeyError(f"Dataset '{dataset_id}' has no split '{split}', expected one of {list(manifest['splits'])}")
+    data = pd.read_parquet(os.path.join(root, dataset_id, manifest['splits'][split]['file']))
+    data.index = pd.DatetimeIndex(data['datetime'].to_numpy(), name='datetime')
+    return data
+
+
+class DatasetBuilder:
+    def __init__(self, data_service=None, root=DATASET_ROOT, cache_dir=MONTH_CACHE):
+        """
+        Build datasets from DataService.get_data or from existing CSV files.
+
+        Parameters:
+            data_service (DataService): Source of the bars (only needed by build()).
+            root (str): Directory of the datasets.
+            cache_dir (str): Directory of the per-month Parquet cache of get_data.
+        """
+        self.data_service = data_service
+        self.root = root
+        self.cache_dir = cache_dir
+
+    # -------------------------------
+    # Source data
+    # -------------------------------
+    def fetch(self, start_date, end_date):
+        """
+        Bars between start_date and end_date ('yyyy-mm-dd'), one calendar month at a time from the
+        month cache. Months that ended before today are cached once fetched; the current month is
+        always fetched again.
+        """
+        months = []
+        for month in pd.period_range(start_date, end_date, freq='M'):
+            path = os.path.join(self.cache_dir, f"{month}.parquet")
+            if os.path.exists(path):
+                bars = pd.read_parquet(path)
+            else:
+                if self.data_service is None:
+                    raise RuntimeError(f"Month {month} is not cached and no data service was given.")
+                # The database filters on timestamps, where a date means midnight: the end bound is the
+                # first day of the next month, so the last day of this month is included.
+                next_month = (month + 1).start_time
+                bars = normalize(self.data_service.get_data(str(month.start_time.date()), str(next_month.date())))
+                bars = bars[bars.index < next_month]
+                if month.end_time.date() < date.today():
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    bars.to_parquet(path, compression='zstd')
+            months.append(bars)
+        data = normalize(pd.concat(months)) if months else pd.DataFrame(columns=BAR_COLUMNS)
+        end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+        return data[(data.index >= pd.Timestamp(start_date)) & (data.index < end)]
+
+    @staticmethod
+    def split(data, spec):
+        """
+        Split data by a spec of split name -> 'start:end' date range (inclusive dates, either side
+        may be empty) or -> fraction of the bars (chronological, fractions taken in order).
+        """
+        splits = {}
+        position = 0
+        for name, rule in spec.items():
+            if isinstance(rule, (int, float)):
+                count = int(round(len(data) * rule))
+                splits[name] = data.iloc[position:position + count]
+                position += count
+            else:
+                start, _, end = rule.partition(':')
+                mask = pd.Series(True, index=data.index)
+                if start:
+                    mask &= data.index >= pd.Timestamp(start)
+                if end:
+                    mask &= data.index < pd.Timestamp(end) + pd.Timedelta(days=1)
+                splits[name] = data[mask.to_numpy()]
+        return splits
+
+    # -------------------------------
+    # Datasets
+    # -------------------------------
+    def build(self, name, start_date, end_date, spec):
+        """
+        Fetch the bars of [start_date, end_date], split them by spec (see split()) and write the
+        dataset. Returns its id.
+        """
+        data = self.fetch(start_date, end_date)
+        source = {'type': 'database', 'start_date': start_date, 'end_date': end_date}
+        return self.write(name, self.split(data, spec), source, spec)
+
+    def import_csv(self, name, paths):
+        """
+        Turn existing CSV files (split name -> path, e.g. data/train.csv) into a dataset. Returns its id.
+        """
+        splits = {split: normalize(pd.read_csv(path)) for split, path in paths.items()}
+        return self.write(name, splits, {'type': 'csv', 'paths': paths}, None)
+
+    def write(self, name, splits, source, spec):
+        """
+        Write the splits and the manifest, unless a dataset with the same content already exists.
+        """
+        hashes = {split: content_hash(data) for split, data in splits.items()}
+        digest = hashlib.sha256(json.dumps(hashes, sort_keys=True).encode()).hexdigest()
+        dataset_id = f"{name}-{digest[:12]}"
+        directory = os.path.join(self.root, dataset_id)
+
+        if not os.path.exists(os.path.join(directory, "manifest.json")):
+            os.makedirs(directory, exist_ok=True)
+            manifest = {
+                'id': dataset_id,
+                'name': name,
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'source': source,
+                'split_spec': spec,
+                'content_hash': digest,
+                'splits': {}
+            }
+            for split, data in splits.items():
+                file_name = f"{split}-{hashes[split][:12]}.parquet"
+                data.to_parquet(os.path.join(directory, file_name), compression='zstd', index=False)
+                manifest['splits'][split] = {
+                    'file': file_name,
+                    'rows': len(data),
+                    'start': str(data.index.min()) if len(data) else None,
+                    'end': str(data.index.max()) if len(data) else None,
+                    'columns': list(data.columns),
+                    'content_hash': hashes[split]
+                }
+            # The manifest is written last: a directory without it is an interrupted build.
+            with open(os.path.join(directory, "manifest.json"), "w") as f:
+                json.dump(manifest, f, indent=4)
+
+        index_path = os.path.join(self.root, "index.json")
+        index = {}
+        if os.path.exists(index_path):
+            with open(index_path, "r") as f:
+                index = json.load(f)
+        index[name] = dataset_id
+        with open(index_path, "w") as f:
+            json.dump(index, f, indent=4, sort_keys=True)
+        return dataset_id
+
+
+def _parse_splits(items):
+    return dict(item.split('=', 1) for item in items)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build versioned train/test datasets.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help="Import CSV files as a dataset.")
+    import_parser.add_argument("--name", required=True)
+    import_parser.add_argument("--split", nargs="+", default=["train=data/train.csv", "test=data/test.csv"],
+                               help="split=path pairs.")
+    build_parser = commands.add_parser('build', help="Build a dataset from the database.")
+    build_parser.add_argument("--name", required=True)
+    build_parser.add_argument("--start", required=True, help="yyyy-mm-dd")
+    build_parser.add_argument("--end", required=True, help="yyyy-mm-dd")
+    build_parser.add_argument("--split", nargs="+", required=True,
+                              help="split=START:END date ranges or split=fraction pairs.")
+    for command in (import_parser, build_parser):
+        command.add_argument("--root", default=DATASET_ROOT)
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        dataset_id = DatasetBuilder(root=args.root).import_csv(args.name, _parse_splits(args.split))
+    else:
+        from data.service import DataService
+        spec = {
+            split: float(rule) if ':' not in rule else rule
+            for split, rule in _parse_splits(args.split).items()
+        }
+        dataset_id = DatasetBuilder(DataService(), root=args.root).build(args.name, args.start, args.end, spec)
+    manifest = load_manifest(dataset_id, args.root)
+    for split, info in manifest['splits'].items():
+        print(f"{split}: {info['rows']} bars from {info['start']} to {info['end']}")
+    print(dataset_id)
+
+
+if __name__ == "__main__":
+    main()
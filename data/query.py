@@ -9,4 +9,15 @@ MATCHED_VOLUME_QUERY = """
         OR m.datetime::TIME BETWEEN '13:00:00' AND '14:30:00'
     )
   order by m.datetime
+"""
+
+# Last matched price of the front-month and next-month contracts for every trading day.
+# The day the VN30F1M ticker changes is a roll; the previous day's closes of the old and new
+# contracts give the roll gap used for back-adjustment.
+ROLL_CALENDAR_QUERY = """
+  select distinct on (fc.datetime, fc.futurecode) fc.datetime, fc.futurecode, fc.tickersymbol, m.price
+  from quote.futurecontractcode fc join quote.matched m on m.tickersymbol = fc.tickersymbol and date(m.datetime) = fc.datetime
+  where fc.futurecode in ('VN30F1M', 'VN30F2M')
+    and fc.datetime between %s and %s
+  order by fc.datetime, fc.futurecode, m.datetime desc
 """
\ No newline at end of file
@@ -1,6 +1,7 @@
 import psycopg2
 import pandas as pd
 from data.query import MATCHED_VOLUME_QUERY
+from data.continuous import RollCalendar, ContinuousContractBuilder
 from ssi_fc_data import fc_md_client, model
 from config.config import *
 from config import config_vn30_data as config
@@ -149,6 +150,16 @@ class DataService:
         data.dropna(inplace=True)
         return data
     
+    def get_continuous_data(self, start_date: str, end_date: str, method: str = 'difference') -> pd.DataFrame:
+        """
+        Same as get_data, with the VN30F1M prices back-adjusted across contract rolls
+        ('difference' or 'ratio') and a 'Roll' column marking the last bar before each roll.
+        The roll calendar is fetched once and cached on disk.
+        """
+        data = self.get_data(start_date, end_date)
+        roll_calendar = RollCalendar.load(self, start_date, end_date)
+        return ContinuousContractBuilder(roll_calendar, method).build(data)
+
     def get_train_data(self) -> pd.DataFrame:
         train = pd.read_csv("data/train.csv")
         # set datetime as index
@@ -0,0 +1,456 @@
+"""
+Live market data ingestion.
+
+Messages of the SSI FastConnect hub (futures trades and the VN30 index) are aggregated into the
+1-minute bars of data/train.csv (datetime, open, high, low, close, volume, vn30), appended to a
+CSV file and published to in-process consumers:
+
+    source (SSI hub or local replay) -> bounded queue -> BarAggregator per feed -> aligned bars
+        -> BarStore (CSV append) -> BarPublisher (one bounded queue per consumer)
+
+Every queue is bounded, so a slow consumer slows the publisher, which stops reading the source
+(the replay server then waits on its socket, the SSI hub thread waits on the queue).
+
+Replay test (10x real rate, 30 minutes of data/test.csv):
+    python -m data.stream --replay data/test.csv --bars 30 --speed 10
+
+With a 3 s silence halfway and a 1 s idle timeout (every bar must still be published):
+    python -m data.stream --replay data/test.csv --bars 30 --speed 0 --pause 3 --idle-timeout 1
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+
+TRADE_TYPES = ('X-TRADE', 'X')
+INDEX_TYPE = 'MI'
+BAR_COLUMNS = ['datetime', 'open', 'high', 'low', 'close', 'volume', 'vn30']
+# Marks the end of a stream in the queues.
+END = None
+
+
+def parse_message(message):
+    """
+    Parse a hub message into (symbol, timestamp, price, volume), or None when it carries no trade
+    or index value. Trade messages ('X-TRADE', 'X') are keyed by 'Symbol', index messages ('MI')
+    by 'IndexId'; 'Content' may still be a JSON string as sent by the hub.
+    """
+    data_type = message.get('DataType')
+    content = message.get('Content')
+    if isinstance(content, str):
+        content = json.loads(content)
+    if data_type in TRADE_TYPES:
+        symbol, price, volume = content.get('Symbol'), content.get('LastPrice'), content.get('LastVol') or 0
+    elif data_type == INDEX_TYPE:
+        symbol, price, volume = content.get('IndexId'), content.get('IndexValue'), 0
+    else:
+        return None
+    if not price:
+        return None
+    timestamp = datetime.strptime(f"{content['TradingDate']} {content['Time']}", "%d/%m/%Y %H:%M:%S")
+    return symbol, timestamp, float(price), int(volume)
+
+
+class BarAggregator:
+    def __init__(self):
+        """
+        1-minute OHLCV bars of one feed. Only the bars that are still open are kept (one, or two
+        around a minute boundary while late ticks are accepted), so memory does not grow.
+        """
+        self.bars = {}             # minute -> [open, high, low, close, volume]
+        self.closed_until = None   # bars before this minute are closed
+        self.late = 0              # ticks dropped because their bar was already closed
+
+    def add(self, minute, price, volume):
+        if self.closed_until is not None and minute < self.closed_until:
+            self.late += 1
+            return
+        bar = self.bars.get(minute)
+        if bar is None:
+            self.bars[minute] = [price, price, price, price, volume]
+        else:
+            bar[1] = max(bar[1], price)
+            bar[2] = min(bar[2], price)
+            bar[3] = price
+            bar[4] += volume
+
+    def close_before(self, minute):
+        """
+        Close and return the bars before minute as (minute, [open, high, low, close, volume]), in order.
+        """
+        if self.closed_until is None or minute > self.closed_until:
+            self.closed_until = minute
+        closed = sorted(m for m in self.bars if m < minute)
+        return [(m, self.bars.pop(m)) for m in closed]
+
+
+class BarStore:
+    def __init__(self, path):
+        """
+        Append-only CSV of aligned bars, in the format of data/train.csv.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a")
+        if new_file:
+            self.file.write(",".join(BAR_COLUMNS) + "\n")
+            self.file.flush()
+
+    def append(self, bars):
+        lines = "".join(
+            f"{bar['datetime']:%Y-%m-%d %H:%M:%S},{bar['open']},{bar['high']},{bar['low']},{bar['close']},"
+            f"{bar['volume']},{bar['vn30']}\n" for bar in bars
+        )
+        self.file.write(lines)
+        self.file.flush()
+
+    def load(self):
+        data = pd.read_csv(self.path)
+        # set the datetime column as index
+        data.index = pd.to_datetime(data['datetime'])
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class BarPublisher:
+    def __init__(self):
+        """
+        Fan-out of bars to in-process consumers. Each consumer has its own bounded queue and
+        publish() waits while any of them is full.
+        """
+        self.queues = []
+
+    def subscribe(self, maxsize=1000):
+        queue = asyncio.Queue(maxsize)
+        self.queues.append(queue)
+        return queue
+
+    async def publish(self, bar):
+        for queue in self.queues:
+            await queue.put(bar)
+
+    async def close(self):
+        await self.publish(END)
+
+
+class ReplaySource:
+    def __init__(self, host="127.0.0.1", port=8765):
+        """
+        Messages of a ReplayServer: one JSON hub message per line over TCP.
+        """
+        self.host = host
+        self.port = port
+
+    async def feed(self, queue):
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            # Reading stops while the queue is full, so the server waits on its socket.
+            async for line in reader:
+                await queue.put(json.loads(line))
+        finally:
+            if writer is not None:
+                writer.close()
+            await queue.put(END)
+
+
+class SSIStreamSource:
+    def __init__(self, config, channels=("X-TRADE:VN30F1M", "MI:VN30")):
+        """
+        Messages of the SSI FastConnect hub (config.stream_url), one hub connection per channel.
+        """
+        self.config = config
+        self.channels = channels
+
+    async def feed(self, queue):
+        """
+        Feed the hub messages until a stream reports an error, which is then raised.
+        """
+        loop = asyncio.get_running_loop()
+        failed = asyncio.Event()
+        errors = []
+
+        def on_message(message):
+            # Called on the hub thread: block it until the queue has room.
+            asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+
+        def on_error(error):
+            errors.append(error)
+            loop.call_soon_threadsafe(failed.set)
+
+        streams = []
+        try:
+            from ssi_fc_data import fc_md_client, fc_md_stream
+
+            for channel in self.channels:
+                stream = fc_md_stream.MarketDataStream(self.config, fc_md_client.MarketDataClient(self.config))
+                stream.start(on_message, on_error, channel)
+                streams.append(stream)
+            await failed.wait()
+            raise ConnectionError(f"Stream error: {errors[0]}")
+        finally:
+            for stream in streams:
+                stream.connection.close()
+            await queue.put(END)
+
+
+class IngestionService:
+    def __init__(self, source, store=None, symbol="VN30F1M", index="VN30", lateness=2.0, idle_timeout=120.0, queue_size=10000):
+        """
+        Turn the messages of a source into aligned 1-minute bars.
+
+        Parameters:
+            source: ReplaySource or SSIStreamSource (anything with `async feed(queue)`).
+            store (BarStore): Where completed bars are appended (optional).
+            symbol (str): Futures symbol of the bars.
+            index (str): Index id of the 'vn30' column.
+            lateness (float): Seconds a bar stays open after its minute ends, for ticks of the
+                other feed arriving slightly out of order. Later ticks are dropped and counted.
+            idle_timeout (float): Seconds without any message after which the open bars up to the
+                minute of the newest tick are closed (lunch break, end of day). None: only close bars
+                on newer ticks and at the end. Keep it above the longest silence inside
+                a minute, or the bar of that minute closes before its index tick arrives.
+            queue_size (int): Capacity of the message queue between the source and the aggregation.
+
+        A futures bar is published when the index also has a bar for that minute; futures bars
+        without an index value are dropped, like the dropna() of DataService.get_data.
+        """
+        self.source = source
+        self.store = store
+        self.symbol = symbol
+        self.index = index
+        self.lateness = timedelta(seconds=lateness)
+        self.idle_timeout = idle_timeout
+        self.queue_size = queue_size
+        self.publisher = BarPublisher()
+        self.aggregators = {symbol: BarAggregator(), index: BarAggregator()}
+        self.closed_minute = None
+        self.last_minute = None    # minute of the newest tick seen
+        self.stats = {'messages': 0, 'ticks': 0, 'bars': 0, 'late': 0, 'unaligned': 0, 'seconds': 0.0}
+
+    def subscribe(self, maxsize=1000):
+        """
+        Queue receiving every published bar (a dict of BAR_COLUMNS), then None at the end.
+        """
+        return self.publisher.subscribe(maxsize)
+
+    async def run(self):
+        """
+        Ingest until the source ends (or run() is cancelled), then flush the open bars.
+        An error of the source (e.g. a failed connection) is raised once the bars are published.
+        """
+        start = time.perf_counter()
+        messages = asyncio.Queue(self.queue_size)
+        feeder = asyncio.create_task(self.source.feed(messages))
+        try:
+            while True:
+                try:
+                    message = await self._next_message(messages, feeder)
+                except asyncio.TimeoutError:
+                    # Only event time closes bars: ticks after the pause still find their bars open.
+                    if self.last_minute is not None:
+                        idle_until = self.last_minute + timedelta(minutes=1)
+                        if self.closed_minute is None or idle_until > self.closed_minute:
+                            await self._close_bars(idle_until)
+                    continue
+                if message is END:
+                    break
+                self.stats['messages'] += 1
+                tick = parse_message(message)
+                if tick is None or tick[0] not in self.aggregators:
+                    continue
+                symbol, timestamp, price, volume = tick
+                self.stats['ticks'] += 1
+                minute = timestamp.replace(second=0, microsecond=0)
+                self.aggregators[symbol].add(minute, price, volume)
+                if self.last_minute is None or minute > self.last_minute:
+                    self.last_minute = minute
+                # Every bar before the minute of (newest tick - lateness) is complete on both feeds.
+                watermark = (timestamp - self.lateness).replace(second=0, microsecond=0)
+                if self.closed_minute is None or watermark > self.closed_minute:
+                    await self._close_bars(watermark)
+            await self._close_bars(datetime.max)
+            # The source puts END before it finishes: wait for it, raising its error if it failed.
+            await feeder
+        finally:
+            feeder.cancel()
+            self.stats['late'] = sum(aggregator.late for aggregator in self.aggregators.values())
+            self.stats['seconds'] = time.perf_counter() - start
+            await self.publisher.close()
+
+    async def _next_message(self, messages, feeder):
+        """
+        Next message of the queue, or END when the feeder task finished without putting it.
+        Raises the error of a failed feeder, and asyncio.TimeoutError after idle_timeout seconds
+        without a message.
+        """
+        if not messages.empty():
+            return messages.get_nowait()
+        get = asyncio.ensure_future(messages.get())
+        done, _ = await asyncio.wait({get, feeder}, timeout=self.idle_timeout, return_when=asyncio.FIRST_COMPLETED)
+        if get.done():
+            return get.result()
+        get.cancel()
+        if feeder in done:
+            feeder.result()
+            return messages.get_nowait() if not messages.empty() else END
+        raise asyncio.TimeoutError
+
+    async def _close_bars(self, minute):
+        self.closed_minute = minute
+        futures = self.aggregators[self.symbol].close_before(minute)
+        index = dict(self.aggregators[self.index].close_before(minute))
+        bars = []
+        for bar_minute, (open_, high, low, close, volume) in futures:
+            if bar_minute not in index:
+                self.stats['unaligned'] += 1
+                continue
+            bars.append({'datetime': bar_minute, 'open': open_, 'high': high, 'low': low, 'close': close,
+                         'volume': volume, 'vn30': index[bar_minute][3]})
+        if not bars:
+            return
+        if self.store is not None:
+            await asyncio.to_thread(self.store.append, bars)
+        for bar in bars:
+            await self.publisher.publish(bar)
+        self.stats['bars'] += len(bars)
+
+
+# -------------------------------
+# Local replay of the hub
+# -------------------------------
+def replay_messages(data, symbol="VN30F1M", index="VN30"):
+    """
+    Hub messages reproducing the bars of data (data/train.csv format): four trades per bar
+    (open, high, low, close at seconds 5, 20, 35 and 50, the volume split between them) and
+    one index message at second 55. Returns a list of (timestamp, message) in time order.
+    """
+    messages = []
+    seconds = (5, 20, 35, 50)
+    for timestamp, bar in zip(pd.to_datetime(data['datetime']), data.itertuples(index=False)):
+        volume = int(bar.volume)
+        volumes = [volume // 4 + (1 if k < volume % 4 else 0) for k in range(4)]
+        for second, price, tick_volume in zip(seconds, (bar.open, bar.high, bar.low, bar.close), volumes):
+            at = timestamp + timedelta(seconds=second)
+            messages.append((at, {'DataType': 'X-TRADE', 'Content': json.dumps({
+                'Symbol': symbol, 'LastPrice': price, 'LastVol': tick_volume,
+                'TradingDate': f"{at:%d/%m/%Y}", 'Time': f"{at:%H:%M:%S}"})}))
+        at = timestamp + timedelta(seconds=55)
+        messages.append((at, {'DataType': INDEX_TYPE, 'Content': json.dumps({
+            'IndexId': index, 'IndexValue': bar.vn30, 'TradingDate': f"{at:%d/%m/%Y}", 'Time': f"{at:%H:%M:%S}"})}))
+    return messages
+
+
+class ReplayServer:
+    def __init__(self, messages, host="127.0.0.1", port=0, speed=10.0, pause=None):
+        """
+        Local stand-in for the SSI hub: sends (timestamp, message) pairs to every client as JSON
+        lines, paced at `speed` times the real rate (None: as fast as the client reads).
+        Gaps longer than a minute (lunch break, nights) are skipped.
+
+        pause: (message number, seconds) of a silence in the middle of the stream, to test the
+        idle timeout of the IngestionService.
+        """
+        self.messages = messages
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.pause = pause
+        self.server = None
+        self.sent = 0
+        self.seconds = 0.0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def _serve(self, reader, writer):
+        start = time.perf_counter()
+        elapsed = 0.0          # replayed market seconds
+        previous = None
+        for number, (timestamp, message) in enumerate(self.messages):
+            if self.pause is not None and number == self.pause[0]:
+                await asyncio.sleep(self.pause[1])
+                # The silence is not market time: pacing resumes where it stopped.
+                start += self.pause[1]
+            if previous is not None:
+                elapsed += min((timestamp - previous).total_seconds(), 60.0)
+            previous = timestamp
+            if self.speed is not None:
+                delay = start + elapsed / self.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            writer.write((json.dumps(message) + "\n").encode())
+            # Waits while the client is not reading.
+            await writer.drain()
+            self.sent += 1
+        self.seconds = time.perf_counter() - start
+        writer.close()
+
+    def close(self):
+        self.server.close()
+
+
+async def _replay(args):
+    data = pd.read_csv(args.replay)
+    if args.bars:
+        data = data.head(args.bars)
+    messages = replay_messages(data)
+    pause = (len(messages) // 2, args.pause) if args.pause else None
+    server = await ReplayServer(messages, speed=args.speed, pause=pause).start()
+    store = BarStore(args.out) if args.out else None
+    service = IngestionService(ReplaySource(port=server.port), store=store, idle_timeout=args.idle_timeout)
+    bars = service.subscribe()
+
+    async def consume():
+        received = 0
+        while await bars.get() is not END:
+            received += 1
+        return received
+
+    consumer = asyncio.create_task(consume())
+    await service.run()
+    received = await consumer
+    server.close()
+    if store is not None:
+        store.close()
+
+    stats = service.stats
+    span = sum(min((b[0] - a[0]).total_seconds(), 60.0) for a, b in zip(messages, messages[1:]))
+    print(f"Replayed {server.sent} messages of {len(data)} bars in {stats['seconds']:.2f}s "
+          f"({stats['messages'] / stats['seconds']:.0f} messages/s)")
+    if args.speed:
+        print(f"Target at {args.speed:g}x real rate: {span / args.speed:.2f}s")
+    if pause is not None:
+        print(f"Paused {args.pause:g}s after message {pause[0]} (idle timeout: {args.idle_timeout}s)")
+    print(f"Bars published: {received}, late ticks: {stats['late']}, unaligned bars: {stats['unaligned']}")
+    if args.out:
+        print(f"Bars appended to {args.out}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay bars through the live ingestion pipeline.")
+    parser.add_argument("--replay", default="data/test.csv", help="CSV of bars to replay as hub messages.")
+    parser.add_argument("--bars", type=int, default=30, help="Number of bars replayed (0: all).")
+    parser.add_argument("--speed", type=float, default=10.0, help="Multiple of the real message rate (0: unpaced).")
+    parser.add_argument("--out", help="CSV the ingested bars are appended to.")
+    parser.add_argument("--pause", type=float, default=0, help="Seconds of silence halfway through the replay.")
+    parser.add_argument("--idle-timeout", type=float, default=0,
+                        help="Idle timeout of the ingestion in seconds (0: none).")
+    args = parser.parse_args(argv)
+    args.speed = args.speed or None
+    args.idle_timeout = args.idle_timeout or None
+    asyncio.run(_replay(args))
+
+
+if __name__ == "__main__":
+    main()
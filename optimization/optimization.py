@@ -1,48 +1,155 @@
 import optuna
+import hashlib
 import json
+import os
+from time import perf_counter
 import pandas as pd
 from backtesting.backtesting import Backtesting  # adjust import according to your module structure
+from data.dataset import read_split, content_hash
+from performance.store import engine_key
+
+
+class TrialCache:
+    def __init__(self, path=None, data_key="", engine_key=""):
+        """
+        Objective values of already evaluated parameter sets, keyed by a hash of the params, of
+        the training data and of the engine.
+
+        Parameters:
+            path (str): JSON-lines file the cache is loaded from and appended to (None: memory only).
+            data_key (str): Identifies the training data (e.g. its content hash), so values of
+                other data are never reused.
+            engine_key (str): Identifies the backtesting engine (performance.store.engine_key:
+                constants, session mode, execution model and code), so values computed before a
+                change of the strategy are never reused.
+        """
+        self.path = path
+        self.data_key = data_key
+        self.engine_key = engine_key
+        self.values = {}
+        self.hits = 0
+        if path is not None and os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    record = json.loads(line)
+                    self.values[record['key']] = record['value']
+
+    def key(self, params):
+        key = {'data': self.data_key, 'engine': self.engine_key, 'params': params}
+        return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    def get(self, params):
+        value = self.values.get(self.key(params))
+        if value is not None:
+            self.hits += 1
+        return value
+
+    def put(self, params, value):
+        key = self.key(params)
+        self.values[key] = value
+        if self.path is not None:
+            with open(self.path, "a") as f:
+                f.write(json.dumps({'key': key, 'value': value}) + "\n")
 
 class Optimization:
-    def __init__(self, train_data_path, study_name, storage, n_trials, seed=42):
+    # Search space of the strategy parameters: name -> (type, low, high)
+    SEARCH_SPACE = {
+        "sma_window_length": ('int', 10, 100),
+        "sma_gap": ('float', 0.0005, 0.1),
+        "momentum_lookback": ('int', 2, 10),
+        "acceleration_threshold": ('float', 0.1, 1),
+        "short_acceleration_threshold": ('float', 0.05, 0.5),
+        "take_profit_threshold": ('float', 1, 5),
+        "cut_loss_threshold": ('float', 1, 2),
+        "quantity_window": ('int', 2, 20),
+        "quantity_multiply": ('int', 0, 5),
+        "short_extra_profit": ('float', 0, 2),
+        "rsi_window": ('int', 5, 100),
+        "rsi_threshold": ('int', 5, 45),
+        # Volatility regimes of the position sizing (backtesting/regime.py)
+        "regime_window": ('int', 100, 2000),
+        "regime_low_percentile": ('float', 0.05, 0.45),
+        "regime_high_percentile": ('float', 0.55, 0.95)
+    }
+
+    def __init__(self, train_data_path, study_name, storage, n_trials, seed=42, cache_path=None, flush_every=None):
         """
         Initialize the optimization instance.
         
         Parameters:
-            train_data_path (str): Path to the CSV file containing training data.
+            train_data_path (str): Path to the CSV file containing training data, or the id (or name)
+                of a dataset built by data/dataset.py, whose 'train' split is used.
             study_name (str): The name of the Optuna study.
-            storage (str): Storage URL for the study (e.g., 'sqlite:///sma.db').
+            storage (str): Storage of the study (see open_storage): an RDB URL (e.g., 'sqlite:///sma.db'),
+                'journal:<file>' for an append-only journal file, or 'memory' / None.
             n_trials (int): Number of optimization trials.
             seed (int): Seed for the sampler (default 42).
+            cache_path (str): JSON-lines file of the trial cache, kept across runs (None: the cache
+                only lives for this instance). Parameter sets proposed again by the sampler get
+                their cached objective instead of a new backtest.
+            flush_every (int): Run the trials on an in-memory copy of the study and write them to
+                `storage` every flush_every trials (and at the end), instead of one storage round
+                trip per suggestion. Trials of other processes sharing the storage are only seen
+                at the start. None: use the storage directly.
         """
-        self.train = pd.read_csv(train_data_path)
+        self.train = read_split(train_data_path, 'train')
         self.study_name = study_name
         self.storage = storage
         self.n_trials = n_trials
         self.sampler = optuna.samplers.TPESampler(seed=seed)
-        self.backtest = Backtesting()
+        self.backtest = Backtesting(indicator_cache=True)
+        self.cache = TrialCache(cache_path, content_hash(self.train), engine_key(self.backtest))
+        self.flush_every = flush_every
+        self._flushed = 0
+        # Per-trial timings of the last run_optimization() (see timing_summary).
+        self.timings = []
+        self._trial_timing = {}
+
+    @staticmethod
+    def open_storage(storage):
+        """
+        Optuna storage for a storage string: None or 'memory' keeps the study in memory,
+        'journal:<file>' appends to a journal file (no database transaction per call), anything
+        else is an RDB URL such as 'sqlite:///sma.db'.
+        """
+        if storage is None or storage == 'memory':
+            return optuna.storages.InMemoryStorage()
+        if storage.startswith('journal:'):
+            from optuna.storages.journal import JournalFileBackend
+            return optuna.storages.JournalStorage(JournalFileBackend(storage[len('journal:'):]))
+        return storage
     
     def objective(self, trial):
         """
         Objective function for Optuna that suggests parameter values,
         runs the backtesting strategy, and returns the cumulative PNL.
         """
-        params = {
-            "sma_window_length": trial.suggest_int('sma_window_length', 10, 100),
-            "sma_gap": trial.suggest_float('sma_gap', 0.0005, 0.1),
-            "momentum_lookback": trial.suggest_int('momentum_lookback', 2, 10),
-            "acceleration_threshold": trial.suggest_float('acceleration_threshold', 0.1, 1),
-            "short_acceleration_threshold": trial.suggest_float('short_acceleration_threshold', 0.05, 0.5),
-            "take_profit_threshold": trial.suggest_float('take_profit_threshold', 1, 5),
-            "cut_loss_threshold": trial.suggest_float('cut_loss_threshold', 1, 2),
-            "quantity_window": trial.suggest_int('quantity_window', 2, 20),
-            "quantity_multiply": trial.suggest_int('quantity_multiply', 0, 5),
-            "short_extra_profit": trial.suggest_float('short_extra_profit', 0, 2),
-            "rsi_window": trial.suggest_int('rsi_window', 5, 100),
-            "rsi_threshold": trial.suggest_int('rsi_threshold', 5, 45)
+        start = perf_counter()
+        params = {}
+        for name, (kind, low, high) in self.SEARCH_SPACE.items():
+            suggest = trial.suggest_int if kind == 'int' else trial.suggest_float
+            params[name] = suggest(name, low, high)
+        suggested = perf_counter()
+        value = self.cache.get(params)
+        cached = value is not None
+        if not cached:
+            value = self.evaluate(self.backtest, self.train, params)
+            self.cache.put(params, float(value))
+        self._trial_timing[trial.number] = {
+            'suggest': suggested - start,
+            'backtest': perf_counter() - suggested,
+            'cached': cached
         }
-        result = self.backtest.run(self.train, params)
-        # We assume that the last row contains the final cumulative PNL.
+        return value
+
+    @staticmethod
+    def evaluate(backtest, data, params):
+        """
+        Run one backtest and return the final cumulative PNL (the optimization target).
+        """
+        # Only the final state is needed, so skip materializing the per-bar frame.
+        result = backtest.run(data, params, result_shape='none')
+        # The last row contains the final cumulative PNL.
         return result.iloc[-1]["Cumulative PNL"]
 
     def run_optimization(self):
@@ -51,14 +158,67 @@ class Optimization:
         """
         study = optuna.create_study(
             study_name=self.study_name,
-            storage=self.storage,
+            storage=self.open_storage(self.storage),
             load_if_exists=True,
             sampler=self.sampler,
             direction="maximize"
         )
-        study.optimize(self.objective, n_trials=self.n_trials)
+        callbacks = [self._record_timing]
+        persistent = None
+        if self.flush_every is not None:
+            # Work on an in-memory copy that starts from the stored trials.
+            persistent = study
+            study = optuna.create_study(study_name=self.study_name, sampler=self.sampler, direction="maximize")
+            study.add_trials([t for t in persistent.get_trials(deepcopy=False) if t.state.is_finished()])
+            self._flushed = len(study.trials)
+            callbacks.append(lambda memory_study, trial: self._flush(memory_study, persistent, self.flush_every))
+
+        self.timings = []
+        self._trial_timing = {}
+        self._last_trial_end = perf_counter()
+        study.optimize(self.objective, n_trials=self.n_trials, callbacks=callbacks)
+        if persistent is not None:
+            self._flush(study, persistent, 1)
+        summary = self.timing_summary()
+        print(f"{summary['trials']} trials, {summary['cache_hits']} from the trial cache; per trial: "
+              f"backtest {summary['backtest']:.3f}s, sampler {summary['suggest']:.3f}s, "
+              f"storage {summary['storage'] * 1000:.1f}ms")
         return study.best_params
 
+    def _flush(self, study, persistent, every):
+        """
+        Copy the trials finished since the last flush to the persistent study, once `every` have accumulated.
+        """
+        trials = study.get_trials(deepcopy=False)
+        pending = [t for t in trials[self._flushed:] if t.state.is_finished()]
+        if len(pending) >= every:
+            persistent.add_trials(pending)
+            self._flushed += len(pending)
+
+    def _record_timing(self, study, trial):
+        # Whatever the trial took outside of suggest() and the backtest went to the storage
+        # (trial creation, result writes, flushes).
+        now = perf_counter()
+        timing = self._trial_timing.pop(trial.number, {'suggest': 0.0, 'backtest': 0.0, 'cached': False})
+        timing['total'] = now - self._last_trial_end
+        timing['storage'] = timing['total'] - timing['suggest'] - timing['backtest']
+        timing['trial'] = trial.number
+        self.timings.append(timing)
+        self._last_trial_end = now
+
+    def timing_summary(self):
+        """
+        Mean seconds per trial of the last run_optimization(): backtest, suggest (sampler) and
+        storage overhead, with the number of trials served from the trial cache.
+        """
+        timings = pd.DataFrame(self.timings)
+        if timings.empty:
+            return {'trials': 0, 'cache_hits': 0, 'backtest': 0.0, 'suggest': 0.0, 'storage': 0.0, 'total': 0.0}
+        summary = timings[['backtest', 'suggest', 'storage', 'total']].mean().to_dict()
+        summary['trials'] = len(timings)
+        summary['cache_hits'] = int(timings['cached'].sum())
+        return summary
+
     def save_best_params(self, best_params, filepath = 'optimization/best_params.json'):
         """
         Save the best parameters to a JSON file.
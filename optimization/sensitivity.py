@@ -0,0 +1,205 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+import numpy as np
+import pandas as pd
+from backtesting.portfolio import PortfolioBacktesting
+from optimization.optimization import Optimization
+from data.dataset import read_split
+
+# Indicator windows: points sharing them reuse the same cached indicator series.
+CACHE_KEYS = ['sma_window_length', 'momentum_lookback', 'quantity_window', 'rsi_window', 'regime_window']
+# Points run together as the columns of one backtest.
+BATCH_SIZE = 64
+
+# Per-process state of the worker pool, set once by _init_worker.
+_worker = {}
+
+
+def _init_worker(data):
+    _worker['data'] = data
+    _worker['backtest'] = PortfolioBacktesting(indicator_cache=True, independent=True)
+
+
+def _evaluate_batch(points):
+    """
+    Objective of Optimization (final cumulative PNL) of a batch of parameter dictionaries in the
+    current worker. The points are the columns of one independent PortfolioBacktesting run on the
+    same data, so the bars are walked once per batch instead of once per point.
+    """
+    data = _worker['data']
+    result = _worker['backtest'].run({k: data for k in range(len(points))}, dict(enumerate(points)))
+    return [result[f'PNL {k}'].sum() for k in range(len(points))]
+
+
+class SensitivityAnalyzer:
+    def __init__(self, train_data_path, params=None, float_steps=20, n_jobs=1, space=None):
+        """
+        Measure how the objective of Optimization reacts to moving the parameters around an optimum.
+
+        Parameters:
+            train_data_path (str or DataFrame): CSV path or dataset id of the training data (as in
+                Optimization) or the data itself.
+            params (dict): The optimum to analyze (default: optimization/best_params.json).
+            float_steps (int): A float parameter moves by (high - low) / float_steps per step; ints move by 1.
+            n_jobs (int): Number of worker processes used to evaluate the points (default 1).
+            space (dict): Search space name -> (type, low, high) (default: the parameters of
+                Optimization.SEARCH_SPACE present in params).
+        """
+        self.train = read_split(train_data_path, 'train')
+        if params is None:
+            with open('optimization/best_params.json', 'r') as f:
+                params = json.load(f)
+        self.params = params
+        if space is None:
+            # Optional parameters (e.g. the volatility regimes) are only varied when the optimum has them.
+            space = {name: spec for name, spec in Optimization.SEARCH_SPACE.items() if name in params}
+        self.space = space
+        self.float_steps = float_steps
+        self.n_jobs = n_jobs
+
+    def step_size(self, name):
+        kind, low, high = self.space[name]
+        return 1 if kind == 'int' else (high - low) / self.float_steps
+
+    def _clip(self, name, value):
+        kind, low, high = self.space[name]
+        value = min(max(value, low), high)
+        return int(round(value)) if kind == 'int' else float(value)
+
+    def neighbourhood(self, k=2):
+        """
+        One-at-a-time neighbourhood: every parameter moved by -k..k steps while the others stay at the optimum.
+        Returns a DataFrame with one row per point and the 'param' and 'step' that were moved.
+        """
+        rows = []
+        for name in self.space:
+            for step in range(-k, k + 1):
+                if step == 0:
+                    continue
+                value = self._clip(name, self.params[name] + step * self.step_size(name))
+                if value == self.params[name]:
+                    continue
+                rows.append({**self.params, name: value, 'param': name, 'step': step})
+        return pd.DataFrame(rows)
+
+    def latin_hypercube(self, n_points=1000, radius=0.1, seed=None):
+        """
+        Latin hypercube sample of n_points in a box of +-radius * (high - low) around the optimum
+        (see analyze_latin_hypercube).
+        """
+        rng = np.random.default_rng(seed)
+        columns = {}
+        for name, (kind, low, high) in self.space.items():
+            # One point per stratum, strata shuffled independently per dimension.
+            strata = (rng.permutation(n_points) + rng.random(n_points)) / n_points
+            half_width = radius * (high - low)
+            values = np.clip(self.params[name] - half_width + 2 * half_width * strata, low, high)
+            columns[name] = np.round(values).astype(int) if kind == 'int' else values
+        return pd.DataFrame(columns)
+
+    def evaluate(self, points):
+        """
+        Evaluate every point (a DataFrame with one column per parameter) and return the objectives.
+
+        Points are sorted by their indicator windows before being split into batches of at most
+        BATCH_SIZE, so each worker computes every indicator series once and serves the remaining
+        points from its cache; the points of a batch are backtested together.
+        """
+        order = points.sort_values([key for key in CACHE_KEYS if key in points], kind='stable').index
+        # Parameters the space does not vary (e.g. fixed regime settings) stay at the optimum.
+        records = [{**self.params, **point} for point in points.loc[order, list(self.space)].to_dict('records')]
+        batch_size = min(BATCH_SIZE, -(-len(records) // self.n_jobs))
+        batches = [records[start:start + batch_size] for start in range(0, len(records), batch_size)]
+        if self.n_jobs == 1:
+            _init_worker(self.train)
+            values = [value for batch in batches for value in _evaluate_batch(batch)]
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_jobs, initializer=_init_worker, initargs=(self.train,)) as executor:
+                values = [value for batch in executor.map(_evaluate_batch, batches) for value in batch]
+        return pd.Series(values, index=order).reindex(points.index)
+
+    def analyze(self, k=2, tolerance=0.2):
+        """
+        Run the one-at-a-time neighbourhood scan and summarize it.
+
+        Returns a dictionary with:
+            - base: objective at the optimum
+            - points: the neighbourhood with an 'objective' column
+            - gradients: per parameter central difference per unit and per 1% of its range,
+              plus the worst and mean objective of its neighbours
+            - robustness_score: mean of objective / base over the neighbourhood, clipped to [0, 1]
+              (1 means a flat plateau, 0 means every neighbour loses the whole edge)
+            - within_tolerance: share of neighbours within tolerance * base of the optimum
+        """
+        points = self.neighbourhood(k)
+        # The optimum is evaluated with the neighbourhood so it shares the same pool and caches.
+        objectives = self.evaluate(pd.concat([pd.DataFrame([self.params]), points], ignore_index=True))
+        base = objectives.iloc[0]
+        points['objective'] = objectives.iloc[1:].to_numpy()
+
+        gradients = {}
+        for name, group in points.groupby('param', sort=False):
+            up = group.loc[group['step'] > 0].sort_values('step')
+            down = group.loc[group['step'] < 0].sort_values('step', ascending=False)
+            # Central difference on the closest points on each side, one-sided at the bounds.
+            high = (up[name].iloc[0], up['objective'].iloc[0]) if len(up) else (self.params[name], base)
+            low = (down[name].iloc[0], down['objective'].iloc[0]) if len(down) else (self.params[name], base)
+            slope = (high[1] - low[1]) / (high[0] - low[0]) if high[0] != low[0] else np.nan
+            _, space_low, space_high = self.space[name]
+            gradients[name] = {
+                'gradient': slope,
+                'gradient_per_pct_range': slope * (space_high - space_low) / 100,
+                'worst': group['objective'].min(),
+                'mean': group['objective'].mean()
+            }
+        return self._summary(base, points, pd.DataFrame(gradients).T, tolerance)
+
+    def analyze_latin_hypercube(self, n_points=1000, radius=0.1, seed=None, tolerance=0.2):
+        """
+        Evaluate a latin hypercube sample around the optimum (all parameters moved at once) and
+        summarize it like analyze(). The gradients are the slopes of a least-squares linear fit
+        of the objective on the parameters over the sample, so they include the interactions the
+        one-at-a-time scan misses. The result also has 'r_squared', how well that plane fits the
+        objective in the box (a low value means the gradients are only rough trends).
+        """
+        points = self.latin_hypercube(n_points, radius, seed)
+        objectives = self.evaluate(pd.concat([pd.DataFrame([self.params])[list(self.space)], points], ignore_index=True))
+        base = objectives.iloc[0]
+        points['objective'] = objectives.iloc[1:].to_numpy()
+
+        names = list(self.space)
+        offsets = points[names].to_numpy(dtype=float) - np.array([self.params[name] for name in names], dtype=float)
+        # Parameters the sample does not move (an int range narrower than a step) get no slope.
+        moved = offsets.std(axis=0) > 0
+        design = np.column_stack([np.ones(len(points)), offsets[:, moved]])
+        coefficients, _, _, _ = np.linalg.lstsq(design, points['objective'].to_numpy(), rcond=None)
+        slopes = np.full(len(names), np.nan)
+        slopes[moved] = coefficients[1:]
+        residuals = points['objective'].to_numpy() - design @ coefficients
+        variance = points['objective'].var(ddof=0)
+        r_squared = 1 - residuals.var() / variance if variance > 0 else np.nan
+
+        ranges = np.array([self.space[name][2] - self.space[name][1] for name in names], dtype=float)
+        gradients = pd.DataFrame({
+            'gradient': slopes,
+            'gradient_per_pct_range': slopes * ranges / 100
+        }, index=names)
+        summary = self._summary(base, points, gradients, tolerance)
+        summary['r_squared'] = r_squared
+        return summary
+
+    @staticmethod
+    def _summary(base, points, gradients, tolerance):
+        if base > 0:
+            robustness_score = float(np.clip(points['objective'] / base, 0, 1).mean())
+            within_tolerance = float((points['objective'] >= (1 - tolerance) * base).mean())
+        else:
+            robustness_score = np.nan
+            within_tolerance = np.nan
+        return {
+            'base': base,
+            'points': points,
+            'gradients': gradients,
+            'robustness_score': robustness_score,
+            'within_tolerance': within_tolerance
+        }
@@ -14,12 +14,15 @@ train_data = data_service.get_train_data()
 backtesting = Backtesting()
 
 study_name = "sma_v2"
+# Storage: an RDB URL, "journal:sma.log" (append-only file) or "memory"; see Optimization.open_storage
 storage = "sqlite:///sma.db"
 n_trials = 1000
 sampler = 22
 train_data_path = "data/train.csv"
+# Objectives of already evaluated parameter sets, reused instead of running the backtest again
+trial_cache_path = "optimization/trial_cache.jsonl"
 
-optimization = Optimization(train_data_path, study_name, storage, n_trials, sampler)
+optimization = Optimization(train_data_path, study_name, storage, n_trials, sampler, cache_path=trial_cache_path)
 
 results = optimization.run_optimization()
 optimization.save_best_params(results)
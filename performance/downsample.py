@@ -0,0 +1,76 @@
+import numpy as np
+
+METHODS = ('lttb', 'minmax')
+
+
+def minmax_indices(y, n_buckets):
+    """
+    Indices of the minimum and maximum of y in each of n_buckets equal buckets of bars, plus the
+    first and last bar, in order. Keeps every peak and trough, so the drawn envelope is exact at
+    one bucket per pixel.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    size = int(np.ceil(n / n_buckets))
+    padded = np.pad(y, (0, size * n_buckets - n), mode='edge').reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    lows = offsets + np.argmin(padded, axis=1)
+    highs = offsets + np.argmax(padded, axis=1)
+    indices = np.concatenate(([0, n - 1], lows, highs))
+    return np.unique(np.minimum(indices, n - 1))
+
+
+def lttb_indices(y, n_out):
+    """
+    Indices of n_out points of y picked by Largest-Triangle-Three-Buckets: the first and last bar,
+    and in each bucket between them the bar forming the largest triangle with the previously picked
+    bar and the mean of the next bucket. Keeps the visual shape of the line with few points.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=float)
+    # Bucket edges of the n - 2 inner bars, split into n_out - 2 buckets.
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Mean of every bucket, computed at once; the last bucket's "next" is the last bar.
+    sums = np.add.reduceat(y[:n - 1], edges[:-1])
+    counts = np.diff(edges)
+    means_y = np.r_[sums / counts, y[-1]]
+    means_x = np.r_[(edges[:-1] + edges[1:] - 1) / 2, x[-1]]
+
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Twice the triangle areas (previous point, candidate, mean of the next bucket).
+        areas = np.abs(
+            (x[previous] - means_x[bucket + 1]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (means_y[bucket + 1] - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+    return indices
+
+
+def downsample(y, max_points, method='lttb'):
+    """
+    Indices of at most max_points bars of y to draw (every bar when max_points is None).
+
+    Parameters:
+        y (array-like): Values of the series.
+        max_points (int): Number of points to keep.
+        method (str): 'lttb' (Largest-Triangle-Three-Buckets) or 'minmax' (min/max envelope per
+            bucket, max_points // 2 buckets).
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}', expected one of {METHODS}")
+    if max_points is None:
+        return np.arange(len(y))
+    if method == 'lttb':
+        return lttb_indices(y, max_points)
+    return minmax_indices(y, max(1, max_points // 2))
@@ -1,5 +1,10 @@
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.figure import Figure
+from performance.downsample import downsample
+
+# Points drawn per line: about two per horizontal pixel of a 12-inch figure at 100 dpi.
+MAX_PLOT_POINTS = 2400
 
 class Metric:
     def __init__(self, result_df):
@@ -13,18 +18,67 @@ class Metric:
         """
         self.result_df = result_df
 
-    def plot_pnl(self):
+    def plot_pnl(self, save_path=None, max_points=MAX_PLOT_POINTS, method='lttb'):
         """
         Plot the cumulative PNL over time.
+        The figure is rendered off-screen and saved to save_path when given, otherwise shown.
+
+        Parameters:
+            save_path (str): File to write (format from the extension, e.g. .png or .svg).
+            max_points (int): Points drawn after downsampling (None: every bar).
+            method (str): Downsampling method, 'lttb' or 'minmax' (see performance.downsample).
+        """
+        fig, ax = self._figure(save_path)
+        x, y = self._downsampled(self.result_df['Cumulative PNL'], max_points, method)
+        ax.plot(x, y, label='Cumulative PNL')
+        ax.set_xlabel('Time')
+        ax.set_ylabel('Cumulative PNL')
+        ax.set_title('Cumulative PNL Over Time')
+        ax.legend()
+        ax.grid(True)
+        self._show_or_save(fig, save_path)
+
+    @staticmethod
+    def plot_runs(results, column='Cumulative PNL', save_path=None, max_points=MAX_PLOT_POINTS, method='lttb'):
         """
-        plt.figure(figsize=(12, 6))
-        plt.plot(self.result_df.index, self.result_df['Cumulative PNL'], label='Cumulative PNL')
-        plt.xlabel('Time')
-        plt.ylabel('Cumulative PNL')
-        plt.title('Cumulative PNL Over Time')
-        plt.legend()
-        plt.grid(True)
-        plt.show()
+        Overlay one column of many backtest results on one figure, each line downsampled to
+        max_points, so the rendering time depends on the number of runs and not of bars.
+
+        Parameters:
+            results (dict): Label -> result DataFrame.
+            column (str): Column to plot (default: 'Cumulative PNL').
+            save_path, max_points, method: As in plot_pnl.
+        """
+        fig, ax = Metric._figure(save_path)
+        for label, result_df in results.items():
+            x, y = Metric._downsampled(result_df[column], max_points, method)
+            ax.plot(x, y, label=label, linewidth=1)
+        ax.set_xlabel('Time')
+        ax.set_ylabel(column)
+        ax.set_title(f'{column} Over Time')
+        # A legend of dozens of runs would cover the plot.
+        if len(results) <= 20:
+            ax.legend()
+        ax.grid(True)
+        Metric._show_or_save(fig, save_path)
+
+    @staticmethod
+    def _downsampled(series, max_points, method):
+        indices = downsample(series.to_numpy(), max_points, method)
+        return series.index[indices], series.to_numpy()[indices]
+
+    @staticmethod
+    def _figure(save_path):
+        # Saved figures are built outside pyplot: no GUI backend, nothing to close.
+        fig = plt.figure(figsize=(12, 6)) if save_path is None else Figure(figsize=(12, 6))
+        return fig, fig.add_subplot()
+
+    @staticmethod
+    def _show_or_save(fig, save_path):
+        if save_path is None:
+            plt.show()
+        else:
+            fig.savefig(save_path, bbox_inches='tight')
 
     def calculate_sharpe(self, risk_free_rate=0.00001):
         """
@@ -82,9 +136,9 @@ class Metric:
         short_count = last_row.get('Cumulative Short', 0)
         return long_count, short_count
 
-    def show_metrics(self):
+    def calculate_metrics(self):
         """
-        Calculate and print all performance metrics.
+        Calculate all performance metrics.
         Returns a dictionary with the following keys:
             - Sharpe Ratio
             - Maximum Drawdown
@@ -104,24 +158,35 @@ class Metric:
             'Total Long Trades': long_count,
             'Total Short Trades': short_count
         }
+        return metrics
 
+    def show_metrics(self):
+        """
+        Calculate and print all performance metrics (see calculate_metrics).
+        """
+        metrics = self.calculate_metrics()
         print("Performance Metrics:")
         for key, value in metrics.items():
             print(f"{key}: {value}")
         return metrics
 
-    def plot_contracts_held(self):
+    def plot_contracts_held(self, save_path=None, max_points=MAX_PLOT_POINTS, method='minmax'):
         """
         Plot the number of contracts held over time.
-        """
-        plt.figure(figsize=(12, 6))
-        plt.plot(self.result_df.index, self.result_df['Contracts Held'], label='Contracts Held', marker='o', linestyle='-')
-        plt.xlabel('Time')
-        plt.ylabel('Contracts Held')
-        plt.title('Contracts Held Over Time')
-        plt.legend()
-        plt.grid(True)
-        plt.show()
+        Parameters as in plot_pnl; the min/max envelope keeps every position change visible.
+        Bars are marked only when every bar is drawn.
+        """
+        fig, ax = self._figure(save_path)
+        contracts = self.result_df['Contracts Held']
+        x, y = self._downsampled(contracts, max_points, method)
+        marker = 'o' if len(x) == len(contracts) else None
+        ax.plot(x, y, label='Contracts Held', marker=marker, linestyle='-')
+        ax.set_xlabel('Time')
+        ax.set_ylabel('Contracts Held')
+        ax.set_title('Contracts Held Over Time')
+        ax.legend()
+        ax.grid(True)
+        self._show_or_save(fig, save_path)
 
     def get_contracts_held_series(self):
         """
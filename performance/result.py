@@ -1,48 +1,59 @@
-import pandas as pd
 from backtesting.backtesting import Backtesting  # Adjust this import based on your project structure
+from performance.store import RunStore
+from data.dataset import read_split
 
 class BacktestResult:
-    def __init__(self, params, asset_value=15000):
+    def __init__(self, params, asset_value=15000, store=None, dataset=None):
         """
         Initialize with the parameters for the backtest and an initial asset value.
         
         Parameters:
             params (dict): A dictionary of strategy parameters.
             asset_value (float): Starting asset value (default: 10000).
+            store (RunStore or str): Optional run store (or its directory). Runs already in the
+                store are loaded instead of recomputed, and new runs are saved to it; results
+                then have the 'summary' shape.
+            dataset (str): Optional id (or name) of a dataset built by data/dataset.py; its
+                'train' and 'test' splits replace data/train.csv and data/test.csv.
         """
         self.params = params
         self.asset_value = asset_value
         self.backtester = Backtesting()
+        self.store = RunStore(store) if isinstance(store, str) else store
+        self.dataset = dataset
 
-    def backtest_insample_data(self, file_path = "data/train.csv"):
+    def run(self, data):
+        if self.store is not None:
+            return self.store.run(self.backtester, data, self.params, self.asset_value)
+        return self.backtester.run(data, self.params, self.asset_value)
+
+    def backtest_insample_data(self, file_path = None):
         """
         Run the backtesting strategy on insample data.
         
         Parameters:
-            file_path (str): Path to the CSV file containing insample data.
+            file_path (str): Path to the CSV file containing insample data, or a dataset id
+                (default: the dataset of this result, else data/train.csv).
         
         Returns:
             DataFrame: The result of the backtest.
         """
-        insample_data = pd.read_csv(file_path)
-        # set the datetime column as index
-        insample_data.index = pd.to_datetime(insample_data['datetime'])
-        result = self.backtester.run(insample_data, self.params, self.asset_value)
+        insample_data = read_split(file_path or self.dataset or "data/train.csv", 'train')
+        result = self.run(insample_data)
         return result
 
-    def backtest_outsample_data(self, file_path = "data/test.csv"):
+    def backtest_outsample_data(self, file_path = None):
         """
         Run the backtesting strategy on outsample data.
         
         Parameters:
-            file_path (str): Path to the CSV file containing outsample data.
+            file_path (str): Path to the CSV file containing outsample data, or a dataset id
+                (default: the dataset of this result, else data/test.csv).
         
         Returns:
             DataFrame: The result of the backtest.
         """
-        outsample_data = pd.read_csv(file_path)
-        # set the datetime column as index
-        outsample_data.index = pd.to_datetime(outsample_data['datetime'])
-        result = self.backtester.run(outsample_data, self.params, self.asset_value)
+        outsample_data = read_split(file_path or self.dataset or "data/test.csv", 'test')
+        result = self.run(outsample_data)
         return result
 
@@ -0,0 +1,188 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from backtesting.backtesting import Backtesting
+
+
+def _block_bootstrap_paths(rng, n_paths, daily_pnl, block_size):
+    """
+    Circular block bootstrap: each path is built from random blocks of consecutive days.
+    """
+    n_days = len(daily_pnl)
+    n_blocks = -(-n_days // block_size)
+    starts = rng.integers(0, n_days, size=(n_paths, n_blocks))
+    days = (starts[:, :, None] + np.arange(block_size)).reshape(n_paths, -1)[:, :n_days] % n_days
+    return daily_pnl[days]
+
+
+def _shuffle_trade_paths(rng, n_paths, trade_pnl, trade_day_starts, trade_day_columns, n_days):
+    """
+    Shuffle the order of the trades and put them back on the original trade times.
+    """
+    if len(trade_pnl) == 0:
+        return np.zeros((n_paths, n_days))
+    shuffled = rng.permuted(np.broadcast_to(trade_pnl, (n_paths, len(trade_pnl))), axis=1)
+    paths = np.zeros((n_paths, n_days))
+    paths[:, trade_day_columns] = np.add.reduceat(shuffled, trade_day_starts, axis=1)
+    return paths
+
+
+def _cost_perturbation_paths(rng, n_paths, trade_pnl, trade_contracts, trade_day_starts, trade_day_columns,
+                             n_days, fee, fee_std, slippage_std):
+    """
+    Redraw the fee per path and a slippage per trade, both charged per closed contract.
+    """
+    if len(trade_pnl) == 0:
+        return np.zeros((n_paths, n_days))
+    fees = np.clip(rng.normal(fee, fee_std, size=(n_paths, 1)), 0, None)
+    slippage = np.abs(rng.normal(0, slippage_std, size=(n_paths, len(trade_pnl))))
+    perturbed = trade_pnl - ((fees - fee) + slippage) * trade_contracts
+    paths = np.zeros((n_paths, n_days))
+    paths[:, trade_day_columns] = np.add.reduceat(perturbed, trade_day_starts, axis=1)
+    return paths
+
+
+_SIMULATIONS = {
+    'block_bootstrap': _block_bootstrap_paths,
+    'trade_shuffle': _shuffle_trade_paths,
+    'cost_perturbation': _cost_perturbation_paths
+}
+
+
+def _simulate_chunk(method, n_paths, seed_sequence, args):
+    """
+    Worker entry point: build n_paths resampled daily PnL paths with its own random stream.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    return _SIMULATIONS[method](rng, n_paths, *args)
+
+
+class Robustness:
+    PERCENTILES = (5, 25, 50, 75, 95)
+
+    def __init__(self, result_df, fee=Backtesting.TRADING_FEE, risk_free_rate=0.00001):
+        """
+        Initialize with the result DataFrame from the backtesting ('full' or 'summary' shape).
+        The DataFrame is expected to have a DatetimeIndex and at least these columns:
+            - 'PNL'
+            - 'Contracts Held'
+            - 'Cumulative Long'
+            - 'Cumulative Short'
+
+        Parameters:
+            result_df (DataFrame): Per-bar backtest result.
+            fee (float): Fee per contract used by the backtest (default: Backtesting.TRADING_FEE).
+            risk_free_rate (float): Annual risk-free rate used for the Sharpe ratio, as in Metric.
+        """
+        self.result_df = result_df
+        self.fee = fee
+        self.risk_free_rate = risk_free_rate
+        days = result_df.index.normalize()
+        self.daily_pnl = result_df['PNL'].groupby(days).sum()
+        self.trades = self.build_trade_ledger(result_df)
+
+        # Position of every trade day in the daily series, and where each day starts in the ledger.
+        trade_days = self.trades.index.normalize()
+        day_changes = np.flatnonzero(np.r_[True, trade_days[1:] != trade_days[:-1]])
+        self._trade_day_starts = day_changes
+        self._trade_day_columns = self.daily_pnl.index.get_indexer(trade_days[day_changes])
+
+    @staticmethod
+    def build_trade_ledger(result_df):
+        """
+        Build the trade ledger from the per-bar result: one row per bar that closed contracts,
+        with the realized 'PNL' and the number of 'Contracts Closed' on that bar.
+        """
+        held = result_df['Contracts Held'].to_numpy(dtype=np.int64)
+        entered = (result_df['Cumulative Long'] + result_df['Cumulative Short']).to_numpy(dtype=np.int64)
+        opened = np.diff(entered, prepend=0)
+        closed = np.r_[0, held[:-1]] + opened - held
+        ledger = pd.DataFrame({'PNL': result_df['PNL'].to_numpy(), 'Contracts Closed': closed}, index=result_df.index)
+        return ledger[closed > 0]
+
+    def _simulate(self, method, args, n_paths, seed, n_jobs, chunk_size):
+        """
+        Split the paths into fixed chunks with independent seeds so the output only depends
+        on the seed, not on n_jobs, and run the chunks in a process pool when n_jobs > 1.
+        """
+        chunks = [min(chunk_size, n_paths - start) for start in range(0, n_paths, chunk_size)]
+        seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+        if n_jobs == 1 or len(chunks) == 1:
+            parts = [_simulate_chunk(method, size, s, args) for size, s in zip(chunks, seeds)]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                parts = list(executor.map(_simulate_chunk, [method] * len(chunks), chunks, seeds, [args] * len(chunks)))
+        return np.vstack(parts)
+
+    def block_bootstrap(self, n_paths=10000, block_size=5, seed=None, n_jobs=1, chunk_size=1000):
+        """
+        Resample the daily PnL in blocks of block_size consecutive days, which keeps
+        short-range autocorrelation (e.g. volatility clusters) inside each path.
+        """
+        args = (self.daily_pnl.to_numpy(), block_size)
+        paths = self._simulate('block_bootstrap', args, n_paths, seed, n_jobs, chunk_size)
+        return self.summarize(paths)
+
+    def shuffle_trades(self, n_paths=10000, seed=None, n_jobs=1, chunk_size=1000):
+        """
+        Shuffle the order of the trades in the ledger. The total PnL is unchanged; the
+        distribution shows how much of the Sharpe ratio and drawdown is due to trade ordering.
+        """
+        args = (self.trades['PNL'].to_numpy(), self._trade_day_starts, self._trade_day_columns, len(self.daily_pnl))
+        paths = self._simulate('trade_shuffle', args, n_paths, seed, n_jobs, chunk_size)
+        return self.summarize(paths)
+
+    def perturb_costs(self, n_paths=10000, fee_std=0.05, slippage_std=0.1, seed=None, n_jobs=1, chunk_size=1000):
+        """
+        Replay the trades with a fee drawn around self.fee for each path (std fee_std) and an
+        extra slippage per trade (absolute normal, std slippage_std), both charged per closed contract.
+        """
+        args = (
+            self.trades['PNL'].to_numpy(), self.trades['Contracts Closed'].to_numpy(),
+            self._trade_day_starts, self._trade_day_columns, len(self.daily_pnl),
+            self.fee, fee_std, slippage_std
+        )
+        paths = self._simulate('cost_perturbation', args, n_paths, seed, n_jobs, chunk_size)
+        return self.summarize(paths)
+
+    def summarize(self, paths):
+        """
+        Compute the metric distributions of a (paths x days) matrix of daily PnL.
+
+        Returns a dictionary with:
+            - sharpe, mdd, final_pnl: one value per path
+            - summary: DataFrame of the metric percentiles (and the unresampled value)
+            - bands: DataFrame of cumulative PnL percentiles per day
+        Sharpe ratio and drawdown follow Metric, computed on daily instead of per-bar PnL.
+        """
+        daily_rf = (1 + self.risk_free_rate) ** (1 / 252) - 1
+        std = paths.std(axis=1, ddof=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sharpe = np.where(std > 0, (paths.mean(axis=1) - daily_rf) / std * np.sqrt(252), np.nan)
+        cumulative = paths.cumsum(axis=1)
+        mdd = (np.maximum.accumulate(cumulative, axis=1) - cumulative).max(axis=1)
+        final_pnl = cumulative[:, -1]
+
+        original = self.daily_pnl.to_numpy()
+        original_cumulative = original.cumsum()
+        original_std = original.std(ddof=1)
+        distributions = {'Sharpe Ratio': sharpe, 'Maximum Drawdown': mdd, 'Final PNL': final_pnl}
+        originals = {
+            'Sharpe Ratio': (original.mean() - daily_rf) / original_std * np.sqrt(252) if original_std > 0 else np.nan,
+            'Maximum Drawdown': (np.maximum.accumulate(original_cumulative) - original_cumulative).max(),
+            'Final PNL': original_cumulative[-1]
+        }
+        summary = pd.DataFrame({
+            metric: {
+                'original': originals[metric],
+                'mean': np.nanmean(values),
+                **{f"p{q}": np.nanpercentile(values, q) for q in self.PERCENTILES}
+            }
+            for metric, values in distributions.items()
+        }).T
+        bands = pd.DataFrame(
+            np.percentile(cumulative, self.PERCENTILES, axis=0).T,
+            index=self.daily_pnl.index,
+            columns=[f"p{q}" for q in self.PERCENTILES]
+        )
+        return {'sharpe': sharpe, 'mdd': mdd, 'final_pnl': final_pnl, 'summary': summary, 'bands': bands}
@@ -0,0 +1,213 @@
+import functools
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+import pandas as pd
+from performance.metric import Metric
+from data.dataset import content_hash
+
+# Summary metrics stored per run; the only columns query() can filter and sort on.
+METRIC_COLUMNS = ['sharpe', 'mdd', 'win_rate', 'total_long', 'total_short', 'final_pnl', 'n_bars', 'elapsed']
+
+CREATE_RUNS_TABLE = """
+  create table if not exists runs (
+    run_id text primary key,
+    params_hash text not null,
+    data_hash text not null,
+    engine text not null,
+    params text not null,
+    asset_value real not null,
+    created_at text not null,
+    sharpe real,
+    mdd real,
+    win_rate real,
+    total_long integer,
+    total_short integer,
+    final_pnl real,
+    n_bars integer,
+    elapsed real
+  )
+"""
+
+
+def hash_params(params):
+    """
+    Stable hash of a parameter dictionary (key order does not matter).
+    """
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# Modules whose code decides the result of a backtest, besides the engine's own classes.
+ENGINE_MODULES = ('backtesting.regime', 'backtesting.sessions')
+
+
+@functools.lru_cache(maxsize=None)
+def _module_source_hash(module_name):
+    return hashlib.sha1(inspect.getsource(sys.modules[module_name]).encode()).hexdigest()
+
+
+def engine_key(backtester):
+    """
+    Description of everything besides the params and the data that changes results: the engine
+    class constants (fee, contract cap, trailing multiplier, ATR baseline...), the session mode,
+    the execution model settings and a hash of the source code of the engine modules (so any
+    change of the strategy logic invalidates cached results).
+    """
+    execution = backtester.execution
+    # The constructor arguments of the execution model, not the arrays it prepares per run.
+    settings = {
+        name: getattr(execution, name, None)
+        for name in inspect.signature(type(execution).__init__).parameters if name != 'self'
+    }
+    constants = {
+        name: getattr(backtester, name) for name in dir(type(backtester))
+        if name.isupper() and not callable(getattr(backtester, name))
+    }
+    modules = {cls.__module__ for cls in type(backtester).__mro__ + type(execution).__mro__ if cls is not object}
+    for name in ENGINE_MODULES:
+        importlib.import_module(name)
+    code = hashlib.sha1("".join(_module_source_hash(name) for name in sorted(modules | set(ENGINE_MODULES))).encode()).hexdigest()
+    return json.dumps({
+        'engine': type(backtester).__name__,
+        'constants': constants,
+        'session_mode': backtester.session_mode,
+        'execution': type(execution).__name__,
+        'execution_settings': settings,
+        'code': code
+    }, sort_keys=True, default=str)
+
+
+class RunStore:
+    def __init__(self, root="runs"):
+        """
+        Persistent store of backtest runs.
+
+        Each run is keyed by the hash of (params, data, asset value, engine settings). Its params and
+        summary metrics are rows of <root>/runs.db (SQLite), and its per-bar PnL and position arrays
+        are a zstd-compressed Parquet file <root>/arrays/<run_id>.parquet.
+
+        Parameters:
+            root (str): Directory of the store (created if needed).
+        """
+        self.root = root
+        self.arrays_dir = os.path.join(root, "arrays")
+        os.makedirs(self.arrays_dir, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(root, "runs.db"))
+        self.connection.execute(CREATE_RUNS_TABLE)
+        self.connection.execute("create index if not exists runs_params_hash on runs (params_hash)")
+        self.connection.execute("create index if not exists runs_sharpe on runs (sharpe)")
+        self.connection.commit()
+
+    @staticmethod
+    def run_id(params, data_hash, asset_value, engine):
+        return hash_params({'params': params, 'data': data_hash, 'asset_value': asset_value, 'engine': engine})
+
+    def arrays_path(self, run_id):
+        return os.path.join(self.arrays_dir, f"{run_id}.parquet")
+
+    def run(self, backtester, data, params, asset_value=10000):
+        """
+        Return the per-bar result of backtester.run(data, params, asset_value) in 'summary' shape,
+        from the store when this exact run was done before, otherwise running and saving it.
+        """
+        data_hash = content_hash(data)
+        engine = engine_key(backtester)
+        run_id = self.run_id(params, data_hash, asset_value, engine)
+        if self.exists(run_id):
+            return self.load(run_id)
+
+        start = time.perf_counter()
+        result = backtester.run(data, params, asset_value, result_shape='summary')
+        elapsed = time.perf_counter() - start
+        self.save(run_id, params, data_hash, asset_value, engine, result, elapsed)
+        return result
+
+    def exists(self, run_id):
+        row = self.connection.execute("select 1 from runs where run_id = ?", (run_id,)).fetchone()
+        return row is not None and os.path.exists(self.arrays_path(run_id))
+
+    def save(self, run_id, params, data_hash, asset_value, engine, result, elapsed=None):
+        """
+        Store the arrays of a per-bar result and its summary metrics.
+        """
+        result.to_parquet(self.arrays_path(run_id), compression='zstd')
+        metric = Metric(result)
+        total_long, total_short = metric.get_long_short_counts() if len(result) else (0, 0)
+        row = {
+            'run_id': run_id,
+            'params_hash': hash_params(params),
+            'data_hash': data_hash,
+            'engine': engine,
+            'params': json.dumps(params, sort_keys=True),
+            'asset_value': asset_value,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'sharpe': metric.calculate_sharpe() if len(result) else None,
+            'mdd': metric.calculate_mdd() if len(result) else None,
+            'win_rate': metric.calculate_win_rate() if len(result) else None,
+            'total_long': int(total_long),
+            'total_short': int(total_short),
+            'final_pnl': float(result['Cumulative PNL'].iloc[-1]) if len(result) else 0.0,
+            'n_bars': len(result),
+            'elapsed': elapsed
+        }
+        columns = ", ".join(row)
+        placeholders = ", ".join("?" for _ in row)
+        # NaN metrics (e.g. no trade at all) are stored as NULL.
+        values = [None if isinstance(v, float) and v != v else v for v in row.values()]
+        self.connection.execute(f"insert or replace into runs ({columns}) values ({placeholders})", values)
+        self.connection.commit()
+
+    def load(self, run_id):
+        """
+        Load the per-bar arrays of a stored run.
+        """
+        return pd.read_parquet(self.arrays_path(run_id))
+
+    def get(self, run_id):
+        """
+        Return the stored row of a run as a dictionary (params decoded), or None.
+        """
+        runs = pd.read_sql_query("select * from runs where run_id = ?", self.connection, params=(run_id,))
+        if runs.empty:
+            return None
+        run = runs.iloc[0].to_dict()
+        run['params'] = json.loads(run['params'])
+        return run
+
+    def query(self, order_by='sharpe', descending=True, limit=20, **filters):
+        """
+        Query the runs by their summary metrics, e.g. the top 20 by Sharpe with MDD below 500:
+
+            store.query(order_by='sharpe', limit=20, max_mdd=500)
+
+        Filters are min_<metric>=value or max_<metric>=value (inclusive), and data_hash=... or
+        params_hash=... for exact matches. Metrics: sharpe, mdd, win_rate, total_long,
+        total_short, final_pnl, n_bars, elapsed.
+        """
+        if order_by not in METRIC_COLUMNS + ['created_at']:
+            raise ValueError(f"Cannot order by '{order_by}', expected one of {METRIC_COLUMNS + ['created_at']}")
+        conditions = []
+        values = []
+        for key, value in filters.items():
+            if key in ('data_hash', 'params_hash'):
+                conditions.append(f"{key} = ?")
+            elif key.startswith(('min_', 'max_')) and key[4:] in METRIC_COLUMNS:
+                conditions.append(f"{key[4:]} {'>=' if key.startswith('min_') else '<='} ?")
+            else:
+                raise ValueError(f"Unknown filter '{key}'")
+            values.append(value)
+        sql = "select * from runs"
+        if conditions:
+            sql += " where " + " and ".join(conditions)
+        sql += f" order by {order_by} is null, {order_by} {'desc' if descending else 'asc'} limit ?"
+        values.append(limit)
+        return pd.read_sql_query(sql, self.connection, params=values)
+
+    def close(self):
+        self.connection.close()